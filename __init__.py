@@ -2,6 +2,7 @@
 import dash
 
 from dotenv import load_dotenv
+from . import api, build_assets, snapshot, startup
 from .layout import serve_layout
 from .callbacks import register_callbacks
 
@@ -21,17 +22,8 @@ def create_app(server):
                             '/static/style.css',
                             '/static/navbar.css']
 
-    # JavaScript for the navigation bar
-    external_scripts = [
-        {"src": "https://code.jquery.com/jquery-3.4.1.slim.min.js",
-         "integrity": "sha384-J6qa4849blE2+poT4WnyKhv5vZF5SrPo0iEjwBvKU7imGFAV0wwj1yYfoRSJoZ+n", # noqa
-         "crossorigin": "anonymous"
-         },
-        {"src": "https://stackpath.bootstrapcdn.com/bootstrap/4.4.1/js/bootstrap.min.js", # noqa
-         "integrity": "sha384-wfSDF2E50Y2D1uUdj0O3uMBJnjuUD4Ih7YwaYd1iqfktj0Uod8GCExl3Og8ifwB6", # noqa
-         "crossorigin": "anonymous"
-         }
-    ]
+    # JavaScript for the navigation bar (vendored by build_assets.py)
+    external_scripts = build_assets.vendor_scripts('/getraenke/')
 
     # Dashboard app
     dashapp = dash.Dash(__name__,
@@ -39,6 +31,7 @@ def create_app(server):
                         url_base_pathname='/getraenke/',
                         external_stylesheets=external_stylesheets,
                         external_scripts=external_scripts,
+                        assets_ignore=build_assets.assets_ignore(),
                         meta_tags=[meta_viewport]
                         )
 
@@ -47,4 +40,8 @@ def create_app(server):
         dashapp.layout = serve_layout()
         register_callbacks(dashapp)
 
+    api.register(server)
+    startup.optimize(dashapp)
+    snapshot.start(dashapp)
+
     return dashapp
@@ -0,0 +1,229 @@
+"""Combine recent purchases with the summaries of compacted purchases.
+
+``compact.py`` rolls old purchases into a table of purchases per month,
+person and product and a table of purchases per day and hour. The
+functions in this module turn both into weighted rows: every raw purchase
+has a ``count`` of one, every summary row the number of purchases it
+stands for. Aggregations then sum up ``count`` instead of counting rows
+and give the same numbers as on the uncompacted data.
+"""
+import numpy as np
+import pandas as pd
+
+# labels of the time groupings, independent of the system locale
+WEEKDAYS = ['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag', 'Freitag',
+            'Samstag', 'Sonntag']
+MONTHS = ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli',
+          'August', 'September', 'Oktober', 'November', 'Dezember']
+
+# label of the bucket summing up entries not shown in a chart
+OTHER = 'Andere'
+
+
+def weighted_purchases(df, summary, products):
+    """Combine purchases and the monthly summary.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Purchase data as returned by ``DataStore.full_data``.
+    summary : pandas.DataFrame
+        Compacted purchases per ``month``, ``name`` and ``barcode`` with
+        ``product`` and ``price`` as attached by the data store.
+    products : pandas.DataFrame
+        Product data, provides the ``stock``.
+
+    Returns
+    -------
+    weighted : pandas.DataFrame
+        Columns of ``df`` plus ``count``. Summary rows are dated to the
+        first day of their month and are paid.
+
+    """
+    compacted = summary[
+        ['month', 'name', 'barcode', 'count', 'product', 'price']
+    ].rename(columns={'month': 'date'}).merge(
+        products[['barcode', 'stock']],
+        on='barcode',
+        how='left',
+    ).assign(paid=1)
+
+    return pd.concat(
+        [df.assign(count=1), compacted],
+        ignore_index=True
+    ).reindex(columns=list(df.columns) + ['count'])
+
+
+def weighted_times(df, hours):
+    """Combine purchase dates and the hourly summary.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Purchase data as returned by ``DataStore.full_data``.
+    hours : pandas.DataFrame
+        Compacted purchases per ``date`` and ``hour``.
+
+    Returns
+    -------
+    weighted : pandas.DataFrame
+        Columns ``date`` and ``count``. Summary rows are dated to the
+        beginning of their hour.
+
+    """
+    compacted = pd.DataFrame({
+        'date': hours['date'] + pd.to_timedelta(hours['hour'], unit='h'),
+        'count': hours['count'],
+    })
+    return pd.concat(
+        [df[['date']].dropna().assign(count=1), compacted],
+        ignore_index=True
+    )
+
+
+def first_date(df, hours):
+    """Return the date of the first purchase.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Purchase data as returned by ``DataStore.full_data``.
+    hours : pandas.DataFrame
+        Compacted purchases per ``date`` and ``hour``.
+
+    Returns
+    -------
+    date : pandas.Timestamp
+        First purchase, only the day is exact for compacted purchases.
+
+    """
+    return min(df['date'].min(), hours['date'].min(),
+               key=lambda date: (pd.isna(date), date))
+
+
+def time_keys(dates):
+    """Split dates into integer hour, weekday and month keys.
+
+    Parameters
+    ----------
+    dates : pandas.Series
+        Dates without missing values.
+
+    Returns
+    -------
+    hours : numpy.ndarray
+        Hour of the day (0-23).
+    weekdays : numpy.ndarray
+        Day of the week (0 is Monday).
+    months : numpy.ndarray
+        Month of the year (0 is January).
+
+    """
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    hours = values.astype('datetime64[h]').astype('int64')
+    # 1970-01-01 was a Thursday
+    weekdays = (hours // 24 + 3) % 7
+    months = values.astype('datetime64[M]').astype('int64') % 12
+    return hours % 24, weekdays, months
+
+
+def count_per(times, unit):
+    """Count purchases per hour, weekday or month.
+
+    Parameters
+    ----------
+    times : pandas.DataFrame
+        Output of :func:`weighted_times`.
+    unit : str
+        One of ``'hour'``, ``'weekday'`` or ``'month'``.
+
+    Returns
+    -------
+    counts : pandas.Series
+        Number of purchases, indexed by hour or by the German name of the
+        weekday or month.
+
+    """
+    hours, weekdays, months = time_keys(times['date'])
+    keys, labels = {
+        'hour': (hours, range(24)),
+        'weekday': (weekdays, WEEKDAYS),
+        'month': (months, MONTHS),
+    }[unit]
+    counts = np.bincount(keys, weights=times['count'], minlength=len(labels))
+    return pd.Series(counts.astype('int64'), index=labels)
+
+
+def count_per_hour_and_weekday(times):
+    """Count purchases per hour of each day of the week.
+
+    Parameters
+    ----------
+    times : pandas.DataFrame
+        Output of :func:`weighted_times`.
+
+    Returns
+    -------
+    counts : pandas.DataFrame
+        Number of purchases, indexed by weekday with a column per hour.
+
+    """
+    hours, weekdays, _ = time_keys(times['date'])
+    counts = np.bincount(weekdays * 24 + hours, weights=times['count'],
+                         minlength=7 * 24)
+    return pd.DataFrame(counts.astype('int64').reshape(7, 24),
+                        index=WEEKDAYS, columns=range(24))
+
+
+def top_n(values, n, page=1):
+    """Select a page of the largest values and bucket the smaller ones.
+
+    Only the entries of the page are sorted, they are found by partial
+    selection in O(len(values)).
+
+    Parameters
+    ----------
+    values : pandas.Series
+        Values to select from, e.g. the number of drinks per person.
+    n : int
+        Number of entries per page.
+    page : int, optional
+        Page to select, 1 shows the ``n`` largest values. Out of range
+        pages are clipped.
+
+    Returns
+    -------
+    selected : pandas.Series
+        Entries of the page in ascending order, preceded by the sum of the
+        smaller entries of the following pages labelled :data:`OTHER` if
+        there are any.
+    others : pandas.Index
+        Labels of the entries summed up in :data:`OTHER`.
+    page_count : int
+        Number of pages.
+
+    """
+    page_count = max(1, -(-len(values) // n))
+    page = min(max(page or 1, 1), page_count)
+    start = (page - 1) * n
+    stop = min(start + n, len(values))
+
+    array = values.to_numpy()
+    if stop - start < len(values):
+        # ranks start to stop - 1 end up in positions start to stop - 1
+        order = np.argpartition(-array, sorted({start, stop - 1}))
+        positions = order[start:stop]
+        others = order[stop:]
+    else:
+        positions = np.arange(len(values))
+        others = positions[:0]
+    positions = positions[np.argsort(array[positions], kind='stable')]
+
+    selected = values.iloc[positions]
+    if len(others):
+        selected = pd.concat([
+            pd.Series([np.nansum(array[others])], index=[OTHER]),
+            selected
+        ])
+
+    return selected, values.index[others], page_count
@@ -0,0 +1,303 @@
+"""Read-only API for the aggregates shown in the dashboard.
+
+Other tools (billing, debt reminders) get the numbers of the dashboard
+without parsing ``purchase.txt`` themselves. All routes are registered
+below ``/getraenke/api/`` and compute their results from frames cached per
+data version, shared by all requests:
+
+- ``debts``: unpaid purchases per person,
+- ``revenue``: revenue and number of purchases,
+- ``stock``: stock and current price of each product,
+- ``forecast``: consumption per day and days until each product runs out
+  (``reorder=1`` lists only the products to reorder),
+- ``persons``: number of purchases per person and product,
+- ``counts``: number of purchases per ``day``, ``month``, ``weekday`` or
+  ``hour`` (parameter ``by``).
+
+Parameters (all optional):
+
+- ``from``, ``to``: inclusive date range (``YYYY-MM-DD`` or ISO date and
+  time, times with an offset are converted to local time). Compacted
+  purchases are dated to the start of their month (the hourly ``counts``
+  to the start of their hour).
+- ``page``, ``page_size``: pagination of tables (default 1 and 100).
+- ``format``: ``json`` (default) or ``csv``.
+
+Responses carry an ETag derived from the data files (and the current day for
+the ``forecast``, which counts the days from today), so unchanged results
+cost a ``304 Not Modified`` without any computation.
+"""
+import datetime
+import hashlib
+import json
+import threading
+
+import flask
+
+from .startup import lazy_import
+
+# imported on first use to keep the startup fast
+pd = lazy_import('pandas')
+aggregates = lazy_import('.aggregates', __package__)
+datastore = lazy_import('.datastore', __package__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+api = flask.Blueprint('api', __name__)
+
+# frames shared by all requests for the same data
+_cache = {}
+_lock = threading.Lock()
+
+
+def register(server, prefix='/getraenke/api'):
+    """Register the API routes with a flask server.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        Server of the dashboard.
+    prefix : str, optional
+        URL prefix of the routes.
+
+    """
+    server.register_blueprint(api, url_prefix=prefix)
+
+
+@api.route('/debts')
+def debts():
+    """Sum up the unpaid purchases of each person."""
+    def compute(frames, start, end):
+        purchases = _between(frames['purchases'], start, end)
+        unpaid = purchases[purchases['paid'] == 0]
+        table = unpaid.groupby('name').agg(
+            price=('price', 'sum'),
+            items=('count', 'sum'),
+        ).reset_index()
+        return table.sort_values('price', ascending=False,
+                                 ignore_index=True)
+
+    return _respond(compute)
+
+
+@api.route('/revenue')
+def revenue():
+    """Sum up the revenue of all purchases."""
+    def compute(frames, start, end):
+        purchases = _between(frames['purchases'], start, end).dropna()
+        return {
+            'from': None if start is None else start.isoformat(),
+            'to': None if end is None else end.isoformat(),
+            'revenue': round(float(
+                (purchases['price'] * purchases['count']).sum()), 2),
+            'purchases': int(purchases['count'].sum()),
+        }
+
+    return _respond(compute)
+
+
+@api.route('/stock')
+def stock():
+    """List stock and current price of each product."""
+    def compute(frames, start, end):
+        return frames['products'][['product', 'barcode', 'stock', 'price']]
+
+    return _respond(compute)
+
+
+@api.route('/forecast')
+def forecast():
+    """Forecast the days until each product runs out of stock."""
+    reorder = flask.request.args.get('reorder', '0')
+    if reorder not in ('0', '1'):
+        flask.abort(400, 'reorder must be 0 or 1')
+
+    def compute(frames, start, end):
+        table = frames['forecast']
+        if reorder == '1':
+            table = table[table['reorder']]
+        return table.sort_values('days_left', ignore_index=True)
+
+    return _respond(compute, daily=True)
+
+
+@api.route('/persons')
+def persons():
+    """Count the purchases of each person and product."""
+    def compute(frames, start, end):
+        purchases = _between(frames['purchases'], start, end)
+        return purchases.groupby(['name', 'product'])['count'].sum() \
+            .reset_index()
+
+    return _respond(compute)
+
+
+@api.route('/counts')
+def counts():
+    """Count the purchases per time bucket."""
+    by = flask.request.args.get('by', 'day')
+    if by not in ('day', 'month', 'weekday', 'hour'):
+        flask.abort(400, 'by must be one of day, month, weekday or hour')
+
+    def compute(frames, start, end):
+        times = _between(frames['times'], start, end)
+        if by == 'day':
+            counts = times.groupby(times['date'].dt.date)['count'].sum()
+        else:
+            counts = aggregates.count_per(times, by)
+        return counts.rename_axis(by).rename('count').reset_index()
+
+    return _respond(compute)
+
+
+def _respond(compute, daily=False):
+    """Compute a result for the request, unless the client has it.
+
+    Parameters
+    ----------
+    compute : callable
+        Called with the cached frames and the date range, returns a
+        pandas.DataFrame (paginated table) or a dict.
+    daily : bool, optional
+        True if the result also changes with the current day.
+
+    Returns
+    -------
+    response : flask.Response
+        JSON or CSV response with an ETag.
+
+    """
+    request = flask.request
+    store = datastore.get_store()
+    version = store.fingerprint
+    if daily:
+        version += datetime.date.today().isoformat()
+    etag = hashlib.sha1((version + request.full_path).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = flask.Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    start, end = _date_range(request.args)
+    output = request.args.get('format', 'json')
+    if output not in ('json', 'csv'):
+        flask.abort(400, 'format must be json or csv')
+
+    result = compute(_frames(store), start, end)
+
+    headers = {}
+    if isinstance(result, dict):
+        result = pd.DataFrame([result]) if output == 'csv' else result
+    else:
+        page, page_size = _page(request.args)
+        headers['X-Total-Count'] = str(len(result))
+        page_count = max(1, -(-len(result) // page_size))
+        table = result.iloc[(page - 1) * page_size:page * page_size]
+        if output == 'json':
+            result = {
+                'page': page,
+                'page_size': page_size,
+                'page_count': page_count,
+                'total': len(result),
+                'data': json.loads(table.to_json(orient='records',
+                                                 date_format='iso')),
+            }
+        else:
+            result = table
+
+    if output == 'csv':
+        response = flask.Response(result.to_csv(index=False),
+                                  mimetype='text/csv', headers=headers)
+    else:
+        response = flask.jsonify(result)
+        response.headers.extend(headers)
+    response.set_etag(etag)
+    return response
+
+
+def _frames(store):
+    """Return the frames of the current data, computed once per version.
+
+    The stock forecast counts the days from today and is also computed
+    again on a new day.
+
+    Parameters
+    ----------
+    store : PurchaseStore
+        Refreshed data store.
+
+    Returns
+    -------
+    frames : dict
+        ``purchases`` (weighted purchases including compacted ones),
+        ``times`` (weighted purchase times), ``products`` and the stock
+        ``forecast``.
+
+    """
+    with _lock:
+        if _cache.get('fingerprint') != store.fingerprint:
+            full_data = store.full_data()
+            _cache.clear()
+            _cache.update(
+                fingerprint=store.fingerprint,
+                purchases=aggregates.weighted_purchases(
+                    full_data, store.summary, store.products
+                ),
+                times=aggregates.weighted_times(full_data, store.hours),
+                products=store.products,
+            )
+        today = datetime.date.today()
+        if _cache.get('forecast_day') != today:
+            _cache.update(forecast=store.forecast(), forecast_day=today)
+        return dict(_cache)
+
+
+def _date_range(args):
+    """Parse the inclusive date range of the request."""
+    try:
+        start = args.get('from')
+        start = None if start is None else _timestamp(start)
+        end = args.get('to')
+        if end is not None:
+            # a date without time includes the whole day
+            end = _timestamp(end) + (
+                pd.Timedelta(days=1, microseconds=-1) if len(end) <= 10
+                else pd.Timedelta(0)
+            )
+    except ValueError:
+        flask.abort(400, 'from and to must be ISO dates')
+    return start, end
+
+
+def _timestamp(value):
+    """Parse an ISO date or time as naive local time like the purchases."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = pd.Timestamp(
+            timestamp.to_pydatetime().astimezone().replace(tzinfo=None)
+        )
+    return timestamp
+
+
+def _page(args):
+    """Parse the pagination of the request."""
+    try:
+        page = int(args.get('page', 1))
+        page_size = int(args.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        flask.abort(400, 'page and page_size must be integers')
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        flask.abort(400, 'page must be positive and page_size at most '
+                         '{}'.format(MAX_PAGE_SIZE))
+    return page, page_size
+
+
+def _between(frame, start, end):
+    """Select the rows of a date range, all rows without a range."""
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= frame['date'] >= start
+    if end is not None:
+        mask &= frame['date'] <= end
+    return frame[mask]
@@ -3,7 +3,7 @@ import dash
 import flask
 from dotenv import load_dotenv
 
-from . import callbacks, layout
+from . import api, build_assets, callbacks, layout, snapshot, startup
 
 # flask server for production environment
 server = flask.Flask(__name__)
@@ -14,10 +14,9 @@ load_dotenv()
 # app initialize
 dashapp = dash.Dash(
     __name__,
-    external_stylesheets=[
-        "assets/css/bootstrap.css",
-        "assets/css/fontawesome.css"
-    ],
+    # trimmed bundle from build_assets.py if available, full css otherwise
+    external_stylesheets=build_assets.stylesheets(),
+    assets_ignore=build_assets.assets_ignore(),
     # these meta_tags ensure content is scaled correctly on different devices
     # see: https://www.w3schools.com/css/css_rwd_viewport.asp for more
     meta_tags=[
@@ -35,3 +34,12 @@ dashapp.layout = layout.serve_layout()
 
 # register callbacks
 callbacks.register_callbacks(dashapp)
+
+# serve the cached layout and warm caches if FAST_STARTUP is set
+startup.optimize(dashapp)
+
+# read-only API for other tools
+api.register(server)
+
+# export a static snapshot for kiosk displays if SNAPSHOT_DIR is set
+snapshot.start(dashapp)
@@ -0,0 +1,103 @@
+/*!
+ * Decoding of compact figures (see encoding.py).
+ *
+ * Replaces base64 typed arrays ({dtype, bdata, shape}) and dictionary
+ * encoded labels ({categories, codes}) in the traces by arrays before
+ * plotly.js plots them, as the bundled plotly.js predates typed arrays.
+ * The traces are decoded into copies, the figure passed in (e.g. the props
+ * of a dash graph) is left unchanged.
+ */
+(function () {
+  var TYPES = {
+    i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+    i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array
+  };
+
+  function decodeArray(value) {
+    var binary = window.atob(value.bdata);
+    var bytes = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    var array = new TYPES[value.dtype](bytes.buffer);
+    if (!value.shape) {
+      return array;
+    }
+
+    // two dimensional arrays as rows of plain arrays
+    var shape = String(value.shape).split(",").map(Number);
+    var rows = [];
+    for (var row = 0; row < shape[0]; row++) {
+      rows.push(Array.prototype.slice.call(
+        array, row * shape[1], (row + 1) * shape[1]));
+    }
+    return rows;
+  }
+
+  function decode(value) {
+    if (!value || typeof value !== "object" || Array.isArray(value) ||
+        ArrayBuffer.isView(value)) {
+      return value;
+    }
+    if (typeof value.bdata === "string" && value.dtype in TYPES) {
+      return decodeArray(value);
+    }
+    if (Array.isArray(value.categories) && value.codes) {
+      var codes = decode(value.codes);
+      var labels = new Array(codes.length);
+      for (var i = 0; i < codes.length; i++) {
+        labels[i] = value.categories[codes[i]];
+      }
+      return labels;
+    }
+    var copy = {};
+    for (var key in value) {
+      if (Object.prototype.hasOwnProperty.call(value, key)) {
+        copy[key] = decode(value[key]);
+      }
+    }
+    return copy;
+  }
+
+  function decodeTraces(data) {
+    return Array.isArray(data) ? data.map(decode) : data;
+  }
+
+  function wrap(Plotly) {
+    ["newPlot", "react"].forEach(function (name) {
+      var plot = Plotly && Plotly[name];
+      if (!plot || plot.decodesFigures) {
+        return;
+      }
+      var wrapped = function (gd, data) {
+        var args = Array.prototype.slice.call(arguments);
+        // called with a figure object or with data, layout and config
+        if (data && !Array.isArray(data) && Array.isArray(data.data)) {
+          args[1] = Object.assign({}, data, {data: decodeTraces(data.data)});
+        } else {
+          args[1] = decodeTraces(data);
+        }
+        return plot.apply(this, args);
+      };
+      wrapped.decodesFigures = true;
+      Plotly[name] = wrapped;
+    });
+    return Plotly;
+  }
+
+  // plotly.js is loaded on demand by the graphs
+  if (window.Plotly) {
+    wrap(window.Plotly);
+  } else {
+    var plotly;
+    Object.defineProperty(window, "Plotly", {
+      configurable: true,
+      get: function () {
+        return plotly;
+      },
+      set: function (value) {
+        plotly = wrap(value);
+      }
+    });
+  }
+})();
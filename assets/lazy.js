@@ -0,0 +1,36 @@
+/*!
+ * Lazy loading of the content below the fold.
+ *
+ * Clicks the hidden "details_visible" button once the detail tabs are
+ * scrolled into view, which triggers the callbacks of the active tab.
+ */
+(function () {
+  function observe() {
+    var target = document.getElementById("details");
+    var trigger = document.getElementById("details_visible");
+
+    // the layout is rendered by React after the page has loaded
+    if (!target || !trigger) {
+      window.setTimeout(observe, 200);
+      return;
+    }
+
+    if (!("IntersectionObserver" in window)) {
+      trigger.click();
+      return;
+    }
+
+    var observer = new IntersectionObserver(function (entries) {
+      var visible = entries.some(function (entry) {
+        return entry.isIntersecting;
+      });
+      if (visible) {
+        trigger.click();
+        observer.disconnect();
+      }
+    }, {rootMargin: "200px"});
+    observer.observe(target);
+  }
+
+  window.addEventListener("load", observe);
+})();
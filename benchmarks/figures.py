@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Compare the plain and the compact serialization of the figures.
+
+Builds the figures of the dashboard from random purchase counts with
+``plot_utils`` and serializes each of them the way dash does, once as is
+and once with ``COMPACT_FIGURES`` (see ``encoding.py``). Reports payload
+size (raw and gzipped), encode time and the time to parse the JSON again.
+The compact figures are checked to decode to the same values.
+
+Usage::
+
+    python benchmarks/figures.py --days 365 3650 --repeat 20
+"""
+import argparse
+import gzip
+import importlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTS = ['Club Mate', 'Cola', 'Cola Zero', 'Fanta', 'Spezi', 'Bier',
+            'Radler', 'Wasser', 'Apfelschorle', 'Eistee', 'Kaffee',
+            'Energy']
+
+
+def build_figures(plot_utils, days, seed=0):
+    """Build the figures of the dashboard from random counts.
+
+    Parameters
+    ----------
+    plot_utils : module
+        Plot functions of the dashboard.
+    days : int
+        Length of the timeline in days.
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    figures : dict
+        Figures by name.
+
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days)
+    months = pd.date_range(end=dates[-1], periods=max(days // 30, 1),
+                           freq='MS')
+    persons = ['Person {}'.format(i) for i in range(20)]
+
+    per_product = {
+        product: pd.Series(rng.random(len(persons)), index=persons)
+        for product in PRODUCTS
+    }
+    inventory = pd.DataFrame({
+        'stock': rng.integers(0, 50, len(PRODUCTS)),
+        'price': rng.choice([0.5, 0.8, 1.0, 1.2], len(PRODUCTS)),
+        'days_left': rng.random(len(PRODUCTS)) * 60,
+        'reorder': rng.random(len(PRODUCTS)) < 0.2,
+    }, index=PRODUCTS)
+
+    return {
+        'timeline': plot_utils.plot_timeline(
+            pd.Series(rng.poisson(20, days), index=dates.date)),
+        'hour': plot_utils.plot_purch_per_time(
+            pd.Series(rng.poisson(50, 24), index=np.arange(24)), 'hour'),
+        'heatmap': plot_utils.plot_hour_weekday(
+            pd.DataFrame(rng.poisson(5, (7, 24)), index=range(7),
+                         columns=range(24))),
+        'inventory': plot_utils.plot_inventory_chart(inventory),
+        'statistics': plot_utils.plot_rel_drinks_per_person(per_product),
+        'person': plot_utils.plot_person_history(pd.DataFrame({
+            'paid': rng.poisson(30, len(months)),
+            'unpaid': rng.poisson(2, len(months)),
+        }, index=months)),
+    }
+
+
+def measure(serialize, repeat):
+    """Serialize a figure repeatedly.
+
+    Returns
+    -------
+    payload : str
+        JSON of the figure.
+    encode : float
+        Median seconds to serialize.
+    parse : float
+        Median seconds to parse the JSON.
+
+    """
+    encode, parse = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = serialize()
+        encode.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        json.loads(payload)
+        parse.append(time.perf_counter() - start)
+    return payload, float(np.median(encode)), float(np.median(parse))
+
+
+def check(encoding, fig, payload):
+    """Check that a compact figure decodes to the values of the plain one."""
+    plain = json.loads(to_json_plotly(fig))['data']
+    decoded = encoding.decode_figure(json.loads(payload))['data']
+    for original, trace in zip(plain, decoded):
+        for key, value in original.items():
+            other = trace[key]
+            if isinstance(value, dict) or value == other:
+                continue
+            try:
+                same = (pd.to_datetime(value) == pd.to_datetime(other)).all()
+            except (TypeError, ValueError):
+                same = np.allclose(np.asarray(value, dtype=float),
+                                   np.asarray(other, dtype=float),
+                                   equal_nan=True)
+            if not same:
+                raise AssertionError('{} differs after decoding'.format(key))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[365, 3650],
+                        help='lengths of the timeline in days')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of serializations per figure')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(ROOT))
+    package = os.path.basename(ROOT)
+    plot_utils = importlib.import_module(package + '.plot_utils')
+    encoding = importlib.import_module(package + '.encoding')
+
+    print('{:<20s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s}'
+          .format('figure', 'bytes', 'compact', 'gzip', 'compact',
+                  'encode', 'compact', 'parse'))
+    for days in args.days:
+        for name, fig in build_figures(plot_utils, days).items():
+            plain, plain_encode, plain_parse = measure(
+                lambda: to_json_plotly(fig), args.repeat)
+            compact, compact_encode, compact_parse = measure(
+                lambda: to_json_plotly(encoding.encode_figure(fig)),
+                args.repeat)
+            check(encoding, fig, compact)
+
+            print('{:<20s} {:>9d} {:>9d} {:>9d} {:>9d} {:>7.2f}ms '
+                  '{:>7.2f}ms {:>8.2f}x'.format(
+                      '{} ({} d)'.format(name, days),
+                      len(plain), len(compact),
+                      len(gzip.compress(plain.encode())),
+                      len(gzip.compress(compact.encode())),
+                      plain_encode * 1000, compact_encode * 1000,
+                      plain_parse / compact_parse,
+                  ))
+    print('parse: speedup of parsing the compact JSON')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""Load test the dashboard with concurrent simulated clients.
+
+Each simulated client behaves like a browser tab: it loads the page, the
+layout and the callback graph from the server and then replays the
+callbacks the way the dash renderer does, i.e. every change of a property
+triggers all callbacks that depend on it. A session consists of the
+initial page load, scrolling the detail tabs into view and a number of
+rounds of
+
+- a new scan appended to the purchase file and an interval tick
+  (``shared_data`` and everything depending on it),
+- cycling through the time filters of the timeline,
+- toggling the statistics switch,
+- opening the person tab, selecting a person and going back.
+
+The data files are generated for each requested size. Requests are sent
+through the flask test client (in-process) or, with ``--http``, to a local
+threaded HTTP server.
+
+Usage::
+
+    python benchmarks/loadtest.py --clients 8 --rounds 3 --sizes 1000 100000
+"""
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_URL = '/getraenke/'
+
+NAMES = ['Anna', 'Ben', 'Carla', 'David', 'Emil', 'Frieda', 'Georg',
+         'Hanna', 'Ida', 'Jonas', 'Karl', 'Lena', 'Max', 'Nora', 'Otto',
+         'Paula']
+PRODUCTS = ['Club Mate', 'Cola', 'Cola Zero', 'Fanta', 'Spezi', 'Bier',
+            'Radler', 'Wasser', 'Apfelschorle', 'Eistee', 'Kaffee',
+            'Energy']
+
+
+def generate_data(directory, n_purchases, n_people=40, n_products=12,
+                  seed=0):
+    """Write a random ``produkt.txt`` and ``purchase.txt``.
+
+    Purchases are spread over the last two years in chronological order.
+    Everything older than 30 days is paid.
+
+    Parameters
+    ----------
+    directory : str
+        Target directory.
+    n_purchases : int
+        Number of purchases.
+    n_people : int
+        Number of distinct persons.
+    n_products : int
+        Number of products.
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    purchase_file : str
+        Path to the purchase file.
+    product_file : str
+        Path to the product file.
+
+    """
+    rng = random.Random(seed)
+    product_file = os.path.join(directory, 'produkt.txt')
+    purchase_file = os.path.join(directory, 'purchase.txt')
+
+    barcodes = []
+    with open(product_file, 'w') as f:
+        for i in range(n_products):
+            barcode = 4000000000000 + i
+            barcodes.append(barcode)
+            name = PRODUCTS[i % len(PRODUCTS)]
+            if i >= len(PRODUCTS):
+                name += ' {}'.format(i // len(PRODUCTS) + 1)
+            f.write('{},{},{},{:.2f},{}\n'.format(
+                i + 1, barcode, name, rng.choice([0.5, 0.8, 1.0, 1.2]),
+                rng.randint(0, 48)
+            ))
+
+    people = [NAMES[i % len(NAMES)]
+              + ('' if i < len(NAMES) else str(i // len(NAMES) + 1))
+              for i in range(n_people)]
+    # a few heavy drinkers, many occasional ones
+    weights = [1 / (i + 1) for i in range(n_people)]
+
+    now = datetime.datetime.now().replace(microsecond=0)
+    start = now - datetime.timedelta(days=730)
+    step = (now - start) / max(n_purchases, 1)
+    paid_until = now - datetime.timedelta(days=30)
+
+    with open(purchase_file, 'w') as f:
+        for i in range(n_purchases):
+            date = start + i * step
+            f.write('{},{},{},{:d}\n'.format(
+                date.strftime('%Y-%m-%d %H:%M:%S'),
+                rng.choices(people, weights)[0],
+                rng.choice(barcodes),
+                date < paid_until
+            ))
+
+    return purchase_file, product_file
+
+
+def append_scan(purchase_file, rng):
+    """Append a purchase like a new scan at the current time.
+
+    The person and product are taken from one of the last purchases of the
+    file.
+
+    Parameters
+    ----------
+    purchase_file : str
+        Path to the purchase file.
+    rng : random.Random
+        Random number generator.
+
+    """
+    with open(purchase_file, 'rb+') as f:
+        start = max(0, f.seek(0, os.SEEK_END) - 4096)
+        f.seek(start)
+        lines = f.read().splitlines()
+        # the first line of the tail may be incomplete
+        if start:
+            lines = lines[1:]
+        _, name, barcode, _ = rng.choice(lines).decode().split(',')
+        f.write('{},{},{},0\n'.format(
+            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            name, barcode
+        ).encode())
+
+
+def load_module(name):
+    """Import a module of the dashboard as a package.
+
+    Parameters
+    ----------
+    name : str
+        Module name within the package, e.g. ``app``.
+
+    Returns
+    -------
+    module : module
+        The imported module.
+
+    """
+    if os.path.dirname(ROOT) not in sys.path:
+        sys.path.insert(0, os.path.dirname(ROOT))
+    return importlib.import_module(os.path.basename(ROOT) + '.' + name)
+
+
+class TestClientTransport:
+    """Send requests through the flask test client (in-process)."""
+
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get(self, path):
+        """Send a GET request and return status and JSON body."""
+        response = self.client.get(path)
+        return response.status_code, _json(response.data)
+
+    def post(self, path, body):
+        """Send a POST request and return status and JSON body."""
+        response = self.client.post(path, json=body)
+        return response.status_code, _json(response.data)
+
+
+class HttpTransport:
+    """Send requests to a running HTTP server."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def get(self, path):
+        """Send a GET request and return status and JSON body."""
+        return self._request(urllib.request.Request(self.url + path))
+
+    def post(self, path, body):
+        """Send a POST request and return status and JSON body."""
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(body).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        return self._request(request)
+
+    @staticmethod
+    def _request(request):
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, _json(response.read())
+        except urllib.error.HTTPError as err:
+            return err.code, None
+
+
+def _json(data):
+    """Decode a JSON response body, None if it is not JSON."""
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class SimulatedClient:
+    """A browser tab replaying the callback graph of the dashboard.
+
+    Parameters
+    ----------
+    transport : TestClientTransport or HttpTransport
+        Transport used to send the requests.
+    names : dict
+        Maps the output string of each callback to a readable name.
+    record : callable
+        Called with the callback name, the latency in seconds and the
+        status code of each callback request.
+    scan : callable
+        Called with the random number generator before each interval tick,
+        adds a purchase so that the tick updates the dashboard.
+
+    """
+
+    def __init__(self, transport, names, record, scan):
+        self.transport = transport
+        self.names = names
+        self.record = record
+        self.scan = scan
+        self.props = {}
+        self.callbacks = []
+        # replays the callbacks like the dash renderer
+        self.callgraph = load_module('callgraph')
+
+    def load(self):
+        """Load the page, the layout and the callback graph.
+
+        Raises
+        ------
+        RuntimeError
+            If one of them cannot be loaded, the session cannot run.
+
+        """
+        responses = []
+        for path in ['', '_dash-layout', '_dash-dependencies']:
+            status, body = self.transport.get(BASE_URL + path)
+            if status != 200:
+                raise RuntimeError('Loading {} failed with status {}'.format(
+                    BASE_URL + path, status))
+            responses.append(body)
+
+        _, layout, callbacks = responses
+        self.props, self.callbacks = self.callgraph.load(layout, callbacks)
+
+        self.callgraph.dispatch(self.callbacks, self.callbacks, self.call)
+
+    def change(self, ident, prop, value):
+        """Change a property and run all callbacks depending on it."""
+        self.props[(ident, prop)] = value
+        self.callgraph.dispatch(
+            self.callbacks,
+            self.callgraph.triggered(self.callbacks, {(ident, prop)}),
+            self.call,
+        )
+
+    def call(self, callback):
+        """Send a single callback request.
+
+        Returns
+        -------
+        changed : set of tuple
+            (id, property) pairs updated by the callback.
+
+        """
+        start = time.perf_counter()
+        status, response = self.transport.post(
+            BASE_URL + '_dash-update-component',
+            self.callgraph.request(callback, self.props)
+        )
+        self.record(self.names.get(callback['output'], callback['output']),
+                    time.perf_counter() - start, status)
+
+        changed = set()
+        if status == 200 and response:
+            changed = self.callgraph.update(self.props, response)
+        return changed
+
+    def session(self, rounds, rng):
+        """Replay a typical visit of the dashboard."""
+        self.load()
+        self.change('details_visible', 'n_clicks', 1)
+
+        for n in range(1, rounds + 1):
+            self.scan(rng)
+            self.change('interval-component', 'n_intervals', n)
+            for filter_by in ['month', 'weekday', 'hour', 'no_filter']:
+                self.change('filter_time_by', 'value', filter_by)
+            self.change('stats_switch', 'value', True)
+            self.change('stats_switch', 'value', False)
+
+            self.change('detail_tabs', 'active_tab', 'tab-person')
+            options = self.props.get(('person_select', 'options')) or []
+            if options:
+                self.change('person_select', 'value',
+                            rng.choice(options)['value'])
+            self.change('detail_tabs', 'active_tab', 'tab-overview')
+
+
+def percentile(values, q):
+    """Return the q-th percentile (nearest rank) of sorted values."""
+    rank = max(0, min(len(values) - 1,
+                      int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def run(transport_factory, names, clients, rounds, purchase_file):
+    """Run concurrent sessions and collect the latencies.
+
+    Parameters
+    ----------
+    transport_factory : callable
+        Returns a new transport for each client.
+    names : dict
+        Maps output strings to callback names.
+    clients : int
+        Number of concurrent clients.
+    rounds : int
+        Number of interaction rounds per session.
+    purchase_file : str
+        Path to the purchase file the simulated scans are appended to.
+
+    Returns
+    -------
+    latencies : dict
+        Maps each callback name to a list of (latency, status) tuples.
+    elapsed : float
+        Wall time in seconds.
+
+    """
+    latencies = defaultdict(list)
+    lock = threading.Lock()
+    scan_lock = threading.Lock()
+    errors = []
+
+    def record(name, latency, status):
+        with lock:
+            latencies[name].append((latency, status))
+
+    def scan(rng):
+        with scan_lock:
+            append_scan(purchase_file, rng)
+
+    def client(seed):
+        try:
+            SimulatedClient(transport_factory(), names, record,
+                            scan).session(rounds, random.Random(seed))
+        except Exception as err:  # report and keep the other clients going
+            errors.append(err)
+
+    threads = [threading.Thread(target=client, args=(seed,))
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for err in errors:
+        print('  client failed: {!r}'.format(err))
+
+    return latencies, elapsed
+
+
+def report(latencies, elapsed):
+    """Print throughput and latency percentiles per callback."""
+    total = sum(len(values) for values in latencies.values())
+    print('  {} callback requests in {:.2f}s -> {:.1f} req/s'.format(
+        total, elapsed, total / elapsed))
+    print('  {:<26s} {:>6s} {:>7s} {:>9s} {:>9s} {:>9s}'.format(
+        'callback', 'count', 'errors', 'p50 [ms]', 'p95 [ms]', 'p99 [ms]'))
+    for name in sorted(latencies):
+        values = sorted(latency for latency, _ in latencies[name])
+        errors = sum(status >= 400 for _, status in latencies[name])
+        print('  {:<26s} {:>6d} {:>7d} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            name, len(values), errors,
+            *(1000 * percentile(values, q) for q in (50, 95, 99))))
+
+
+def main():
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of concurrent clients')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='interaction rounds per client session')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='number of purchases of the generated datasets')
+    parser.add_argument('--people', type=int, default=40,
+                        help='number of persons in the generated datasets')
+    parser.add_argument('--http', action='store_true',
+                        help='send requests to a local HTTP server instead '
+                             'of using the flask test client')
+    args = parser.parse_args()
+
+    app = load_module('app')
+    # failing callbacks are counted in the report
+    app.server.logger.setLevel(logging.CRITICAL)
+    names = {output: callback['callback'].__name__
+             for output, callback in app.dashapp.callback_map.items()}
+
+    if args.http:
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app.server, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}'.format(server.port)
+
+        def transport_factory():
+            return HttpTransport(url)
+    else:
+        def transport_factory():
+            return TestClientTransport(app.server)
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            purchase_file, product_file = generate_data(
+                directory, size, n_people=args.people
+            )
+            os.environ['PURCHASE_FILE'] = purchase_file
+            os.environ['PRODUCT_FILE'] = product_file
+
+            print('{} purchases, {} clients, {} rounds{}'.format(
+                size, args.clients, args.rounds,
+                ' (http)' if args.http else ''))
+            latencies, elapsed = run(transport_factory, names,
+                                     args.clients, args.rounds,
+                                     purchase_file)
+            report(latencies, elapsed)
+
+
+if __name__ == '__main__':
+    main()
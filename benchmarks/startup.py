@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Benchmark the startup time of the dashboard.
+
+Each run starts a fresh interpreter which imports the app, loads the page
+and the layout and requests the first figure, i.e. what a freshly
+restarted worker has to do before it serves its first visitor. Runs are
+repeated with and without ``FAST_STARTUP``.
+
+Usage::
+
+    python benchmarks/startup.py --repeat 5 --max-first-figure 2.0
+
+The data files are taken from ``PURCHASE_FILE`` and ``PRODUCT_FILE``
+(environment or ``.env``). The script exits with status 1 if a median
+exceeds one of the given limits, so it can guard against regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# executed in a fresh interpreter for each run
+CHILD = """
+import importlib, json, sys, time
+
+start = time.perf_counter()
+sys.path.insert(0, {parent!r})
+app = importlib.import_module({package!r} + '.app')
+imported = time.perf_counter()
+
+time.sleep({delay!r})
+client = app.server.test_client()
+requested = time.perf_counter()
+client.get('/getraenke/')
+client.get('/getraenke/_dash-layout')
+layout = time.perf_counter()
+
+response = client.post('/getraenke/_dash-update-component', json={{
+    'output': 'shared_data.children',
+    'outputs': {{'id': 'shared_data', 'property': 'children'}},
+    'inputs': [{{'id': 'interval-component', 'property': 'n_intervals',
+                 'value': 0}}],
+    'state': [{{'id': 'shared_data', 'property': 'children',
+                'value': None}}],
+    'changedPropIds': ['interval-component.n_intervals'],
+}})
+shared_data = response.get_json()['response']['shared_data']['children']
+client.post('/getraenke/_dash-update-component', json={{
+    'output': 'timeline.figure',
+    'outputs': {{'id': 'timeline', 'property': 'figure'}},
+    'inputs': [{{'id': 'shared_data', 'property': 'children',
+                 'value': shared_data}},
+               {{'id': 'filter_time_by', 'property': 'value',
+                 'value': 'no_filter'}}],
+    'changedPropIds': ['shared_data.children'],
+}})
+figure = time.perf_counter()
+
+print(json.dumps({{
+    'import': imported - start,
+    'layout': layout - requested,
+    'first_figure': figure - requested,
+}}))
+"""
+
+
+def run_once(fast, delay):
+    """Start a fresh interpreter and measure its startup.
+
+    Parameters
+    ----------
+    fast : bool
+        Enable ``FAST_STARTUP``.
+    delay : float
+        Seconds between the import and the first request.
+
+    Returns
+    -------
+    timings : dict
+        Seconds for the import of the app, for loading page and layout and
+        until the first figure has been computed.
+
+    """
+    env = dict(os.environ, FAST_STARTUP="1" if fast else "0")
+    code = CHILD.format(parent=os.path.dirname(ROOT),
+                        package=os.path.basename(ROOT),
+                        delay=delay)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of runs per mode")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="seconds between startup and first request")
+    parser.add_argument("--max-import", type=float,
+                        help="limit for the median import time [s]")
+    parser.add_argument("--max-first-figure", type=float,
+                        help="limit for the median time to the first "
+                             "figure [s]")
+    args = parser.parse_args()
+
+    limits = {"import": args.max_import, "first_figure": args.max_first_figure}
+    failed = False
+
+    print("{:<10s} {:>10s} {:>10s} {:>14s}".format(
+        "mode", "import", "layout", "first figure"))
+    for fast in (False, True):
+        runs = [run_once(fast, args.delay) for _ in range(args.repeat)]
+        medians = {key: statistics.median(run[key] for run in runs)
+                   for key in runs[0]}
+        print("{:<10s} {:>9.3f}s {:>9.3f}s {:>13.3f}s".format(
+            "fast" if fast else "default", medians["import"],
+            medians["layout"], medians["first_figure"]))
+
+        for key, limit in limits.items():
+            if limit is not None and medians[key] > limit:
+                print("  {} exceeds the limit of {:.3f}s".format(key, limit))
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""Build a trimmed, self-hosted front-end asset bundle.
+
+The full ``bootstrap.css`` and ``fontawesome.css`` ship thousands of rules
+of which the dashboard uses only a handful. This script
+
+- downloads jQuery and Bootstrap JS into ``assets/vendor`` and checks them
+  against their subresource integrity hashes,
+- purges all CSS rules whose selectors reference classes or ids that do not
+  occur in ``layout.py`` and writes the remainder to
+  ``assets/dist/bundle.css``,
+- subsets the Font Awesome solid font to the icons used by the info cards
+  and writes a single woff2 file next to the bundle.
+
+Run it once with internet access (``python build_assets.py``). Afterwards
+the dashboard is served entirely from local files. Font subsetting requires
+the optional ``fonttools`` (and ``brotli`` for woff2) packages; without
+them the full woff2 font is copied instead.
+"""
+import base64
+import hashlib
+import os
+import re
+import shutil
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(ROOT, "assets")
+CSS_DIR = os.path.join(ASSETS_DIR, "css")
+FONT_DIR = os.path.join(ASSETS_DIR, "webfonts")
+DIST_DIR = os.path.join(ASSETS_DIR, "dist")
+VENDOR_DIR = os.path.join(ASSETS_DIR, "vendor")
+BUNDLE_CSS = os.path.join(DIST_DIR, "bundle.css")
+
+# sources of the bundle (all of them are auto-loaded by dash otherwise)
+CSS_SOURCES = ["bootstrap.css", "fontawesome.css", "responsive-sidebar.css"]
+
+# JavaScript for the navigation bar of the surrounding flask application
+VENDOR_SCRIPTS = [
+    {"file": "jquery-3.4.1.slim.min.js",
+     "url": "https://code.jquery.com/jquery-3.4.1.slim.min.js",
+     "integrity": "sha384-J6qa4849blE2+poT4WnyKhv5vZF5SrPo0iEjwBvKU7imGFAV0wwj1yYfoRSJoZ+n", # noqa
+     },
+    {"file": "bootstrap-4.4.1.min.js",
+     "url": "https://stackpath.bootstrapcdn.com/bootstrap/4.4.1/js/bootstrap.min.js", # noqa
+     "integrity": "sha384-wfSDF2E50Y2D1uUdj0O3uMBJnjuUD4Ih7YwaYd1iqfktj0Uod8GCExl3Og8ifwB6", # noqa
+     },
+]
+
+# Classes rendered by the dash bootstrap components used in layout.py.
+# They do not show up literally in the layout source.
+COMPONENT_CLASSES = {
+    "container", "row", "col", "card", "card-body", "card-header",
+    "form-check", "form-check-inline", "form-check-input",
+    "form-check-label", "nav", "nav-tabs", "nav-item", "nav-link", "active",
+    "tab-content", "tab-pane", "pagination", "page-item", "page-link",
+    "disabled",
+}
+
+# Font Awesome style class -> font file basename
+FONT_FILES = {
+    "fa": "fa-solid-900",
+    "fas": "fa-solid-900",
+    "far": "fa-regular-400",
+    "fab": "fa-brands-400",
+}
+
+
+def vendor_scripts(base_url):
+    """Return the external script definitions for the navigation bar.
+
+    Parameters
+    ----------
+    base_url : str
+        URL prefix of the dash app, e.g. ``'/getraenke/'``.
+
+    Returns
+    -------
+    scripts : list of dict
+        Script definitions for ``dash.Dash(external_scripts=...)``. Points
+        to the vendored copies if they have been built, otherwise to the
+        CDN.
+
+    """
+    scripts = []
+    for script in VENDOR_SCRIPTS:
+        if os.path.isfile(os.path.join(VENDOR_DIR, script["file"])):
+            src = base_url + "assets/vendor/" + script["file"]
+            scripts.append({"src": src, "integrity": script["integrity"]})
+        else:
+            scripts.append({"src": script["url"],
+                            "integrity": script["integrity"],
+                            "crossorigin": "anonymous"})
+    return scripts
+
+
+def assets_ignore():
+    """Return the regex of asset files dash must not auto-load.
+
+    Vendored scripts are always excluded since they are loaded explicitly
+    (and in order) via :func:`vendor_scripts`. Once the bundle has been
+    built, the untrimmed stylesheets are excluded as well.
+
+    Returns
+    -------
+    pattern : str
+        Regular expression matched against asset file names.
+
+    """
+    pattern = r"^(jquery|bootstrap)-[\d.]+(\.slim)?\.min\.js$"
+    if os.path.isfile(BUNDLE_CSS):
+        sources = "|".join(re.escape(name) for name in CSS_SOURCES)
+        pattern += r"|^({})$".format(sources)
+    return pattern
+
+
+def stylesheets():
+    """Return the stylesheets that are not served from the assets folder.
+
+    Returns
+    -------
+    stylesheets : list of str
+        Empty if the bundle has been built, otherwise the full stylesheets.
+
+    """
+    if os.path.isfile(BUNDLE_CSS):
+        return []
+    return ["assets/css/bootstrap.css", "assets/css/fontawesome.css"]
+
+
+def fetch_vendor_scripts():
+    """Download the navigation bar scripts and verify their integrity."""
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    for script in VENDOR_SCRIPTS:
+        with urllib.request.urlopen(script["url"]) as response:
+            content = response.read()
+
+        algorithm, expected = script["integrity"].split("-", 1)
+        digest = hashlib.new(algorithm, content).digest()
+        if base64.b64encode(digest).decode() != expected:
+            raise ValueError(
+                "Integrity check failed for {}".format(script["url"])
+            )
+
+        with open(os.path.join(VENDOR_DIR, script["file"]), "wb") as f:
+            f.write(content)
+
+
+def used_selectors(layout_file):
+    """Collect classes and ids referenced in the layout source.
+
+    Parameters
+    ----------
+    layout_file : str
+        Path to ``layout.py``.
+
+    Returns
+    -------
+    classes : set of str
+        CSS classes used by the layout.
+    ids : set of str
+        Element ids used by the layout.
+
+    """
+    with open(layout_file, encoding="utf-8") as f:
+        source = f.read()
+
+    classes = set(COMPONENT_CLASSES)
+    for match in re.finditer(
+            r"(?:[cC]lassName|icon)\s*=\s*['\"]([^'\"]*)['\"]", source):
+        classes.update(match.group(1).split())
+    for match in re.finditer(r"\bwidth\s*=\s*(\d+)", source):
+        classes.add("col-" + match.group(1))
+
+    ids = set(re.findall(r"\bid\s*=\s*['\"]([\w-]+)['\"]", source))
+    ids.update(re.findall(r"\bident\s*=\s*['\"]([\w-]+)['\"]", source))
+
+    return classes, ids
+
+
+def split_rules(css):
+    """Split a stylesheet into top-level statements.
+
+    Parameters
+    ----------
+    css : str
+        Stylesheet without comments.
+
+    Returns
+    -------
+    rules : list of tuple
+        ``(prelude, body)`` pairs. ``body`` is ``None`` for statements
+        without a block such as ``@import``.
+
+    """
+    rules = []
+    pos = 0
+    while pos < len(css):
+        brace = css.find("{", pos)
+        semicolon = css.find(";", pos)
+        if brace == -1 and semicolon == -1:
+            break
+        if semicolon != -1 and (brace == -1 or semicolon < brace):
+            rules.append((css[pos:semicolon].strip(), None))
+            pos = semicolon + 1
+            continue
+
+        depth = 0
+        for end in range(brace, len(css)):
+            if css[end] == "{":
+                depth += 1
+            elif css[end] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+        rules.append((css[pos:brace].strip(), css[brace + 1:end].strip()))
+        pos = end + 1
+    return rules
+
+
+def selector_is_used(selector, classes, ids):
+    """Check whether all classes and ids of a selector are in use."""
+    # attribute selectors may contain dots or hashes
+    plain = re.sub(r"\[[^\]]*\]", "", selector)
+    for name in re.findall(r"\.(-?[_a-zA-Z][\w-]*)", plain):
+        if name not in classes:
+            return False
+    for name in re.findall(r"#(-?[_a-zA-Z][\w-]*)", plain):
+        if name not in ids:
+            return False
+    return True
+
+
+def purge_rules(rules, classes, ids, fonts):
+    """Drop rules that cannot match any element of the layout.
+
+    Parameters
+    ----------
+    rules : list of tuple
+        Output of :func:`split_rules`.
+    classes : set of str
+        CSS classes in use.
+    ids : set of str
+        Element ids in use.
+    fonts : dict
+        Maps the basename of each used font file to the file name of the
+        trimmed font in the dist folder.
+
+    Returns
+    -------
+    kept : list of str
+        Minified statements that remain in the bundle.
+
+    """
+    kept = []
+    for prelude, body in rules:
+        prelude = " ".join(prelude.split())
+        if body is None:
+            # external imports would break offline use
+            if not prelude.startswith("@import"):
+                kept.append(prelude + ";")
+            continue
+
+        if prelude.startswith(("@media", "@supports")):
+            inner = purge_rules(split_rules(body), classes, ids, fonts)
+            if inner:
+                kept.append(prelude + "{" + "".join(inner) + "}")
+        elif prelude.startswith("@font-face"):
+            for basename, subset in fonts.items():
+                if basename in body:
+                    src = 'src:url("{}") format("woff2")'.format(subset)
+                    body = re.sub(r"src\s*:[^;]*;?", "", body)
+                    body = " ".join(body.split())
+                    kept.append(prelude + "{" + body + src + "}")
+        elif prelude.startswith("@"):
+            # keyframes and friends are cheap, keep them
+            kept.append(prelude + "{" + body + "}")
+        else:
+            selectors = [s.strip() for s in prelude.split(",")]
+            selectors = [s for s in selectors
+                         if selector_is_used(s, classes, ids)]
+            if selectors:
+                body = " ".join(body.split())
+                kept.append(",".join(selectors) + "{" + body + "}")
+    return kept
+
+
+def icon_codepoints(fontawesome_css, classes):
+    """Look up the unicode codepoints of the icon classes in use.
+
+    Parameters
+    ----------
+    fontawesome_css : str
+        Content of ``fontawesome.css``.
+    classes : set of str
+        CSS classes in use.
+
+    Returns
+    -------
+    codepoints : list of int
+        Codepoints of all used icons.
+
+    """
+    codepoints = []
+    pattern = r"\.([\w-]+):before\s*\{[^}]*content:\s*\"\\([0-9a-fA-F]+)\""
+    for name, code in re.findall(pattern, fontawesome_css):
+        if name in classes:
+            codepoints.append(int(code, 16))
+    return codepoints
+
+
+def subset_font(basename, codepoints):
+    """Subset a Font Awesome font to the given codepoints.
+
+    Parameters
+    ----------
+    basename : str
+        Font file name without extension, e.g. ``'fa-solid-900'``.
+    codepoints : list of int
+        Unicode codepoints to retain.
+
+    Returns
+    -------
+    filename : str
+        Name of the written font file in the dist folder.
+
+    """
+    filename = basename + ".woff2"
+    target = os.path.join(DIST_DIR, filename)
+    try:
+        from fontTools import subset
+    except ImportError:
+        print("fonttools not installed, copying the full {}".format(filename))
+        shutil.copy(os.path.join(FONT_DIR, filename), target)
+        return filename
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    font = subset.load_font(os.path.join(FONT_DIR, basename + ".ttf"),
+                            options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    subset.save_font(font, target, options)
+    return filename
+
+
+def build_bundle(layout_file=os.path.join(ROOT, "layout.py")):
+    """Write the purged stylesheet and subset fonts to the dist folder.
+
+    Parameters
+    ----------
+    layout_file : str
+        Path to ``layout.py``.
+
+    """
+    os.makedirs(DIST_DIR, exist_ok=True)
+    classes, ids = used_selectors(layout_file)
+
+    sources = {}
+    for name in CSS_SOURCES:
+        with open(os.path.join(CSS_DIR, name), encoding="utf-8") as f:
+            sources[name] = f.read()
+
+    codepoints = icon_codepoints(sources["fontawesome.css"], classes)
+    fonts = {}
+    for style in sorted(set(FONT_FILES) & classes):
+        basename = FONT_FILES[style]
+        if basename not in fonts:
+            fonts[basename] = subset_font(basename, codepoints)
+
+    bundle = []
+    for name in CSS_SOURCES:
+        css = sources[name]
+        licenses = re.findall(r"/\*!.*?\*/", css, flags=re.S)
+        css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+        rules = purge_rules(split_rules(css), classes, ids, fonts)
+        if rules:
+            bundle.extend(licenses[:1])
+            bundle.extend(rules)
+
+    with open(BUNDLE_CSS, "w", encoding="utf-8") as f:
+        f.write("\n".join(bundle) + "\n")
+
+
+def main():
+    """Build all assets."""
+    fetch_vendor_scripts()
+    build_bundle()
+    print("Assets written to {} and {}".format(VENDOR_DIR, DIST_DIR))
+
+
+if __name__ == "__main__":
+    main()
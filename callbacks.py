@@ -1,90 +1,191 @@
 """Callbacks for the main app."""
-import os
+import datetime
 
-import pandas as pd
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 
-from . import plot_utils
+from .startup import lazy_import
+
+# imported on first use to keep the startup fast
+pd = lazy_import('pandas')
+aggregates = lazy_import('.aggregates', __package__)
+datastore = lazy_import('.datastore', __package__)
+encoding = lazy_import('.encoding', __package__)
+plot_utils = lazy_import('.plot_utils', __package__)
+
+# bars per page of the inventory and statistics charts
+CHART_ROWS = 20
+
+# operators of the dash table filter syntax, words and multi-character
+# operators before the single characters they start with
+FILTER_OPERATORS = [['contains '], ['ge ', '>='], ['le ', '<='], ['ne ', '!='],
+                    ['lt ', '<'], ['gt ', '>'], ['eq ', '=']]
 
 
 def register_callbacks(dashapp):
     """Register callbacks with the dash server."""
     @dashapp.callback(
         Output("shared_data", "children"),
-        [Input("interval-component", "n_intervals")]
+        [Input("interval-component", "n_intervals")],
+        [State("shared_data", "children")]
     )
-    def update_data(n_intervals):
+    def update_data(n_intervals, shared_data):
         """Update the purchase data in regular intervals.
 
-        Update interval is controlled by the interval component.
+        Update interval is controlled by the interval component. The
+        purchases stay in the data store on the server, only its
+        fingerprint and the current day are sent to the browser. The
+        other callbacks run again if the data files changed or a new day
+        started, which moves the bestseller of the month and the stock
+        forecast.
 
         Parameters
         ----------
         n_intervals : int
             Number of passed intervals.
+        shared_data : str
+            Value the browser has.
 
         Returns
         -------
-        full_data : str
-            JSON serialized pandas data frame containing purchase data.
+        shared_data : str
+            Fingerprint of the data files and the current day, triggers the
+            other callbacks.
 
         """
-        # read individual data files
-        purchases = pd.read_csv(
-            os.getenv("PURCHASE_FILE"),
-            header=None,
-            names=['date', 'name', 'barcode', 'paid']
-        )
+        # read data files (only if they changed since the last update)
+        fingerprint = '{}-{}'.format(datastore.get_store().fingerprint,
+                                     datetime.date.today().isoformat())
 
-        products = pd.read_csv(
-            os.getenv("PRODUCT_FILE"),
-            header=None,
-            names=['id', 'barcode', 'product', 'price', 'stock']
-        )
+        # nothing to redraw if neither the files nor the day changed
+        if fingerprint == shared_data:
+            raise PreventUpdate
 
-        # combine data files into a single data frame
-        full_data = purchases.merge(
-            products,
-            on='barcode',
-            # retain rows for never purchased products to make the
-            # inventory work
-            how='outer',
-        ).reindex(
-            columns=['date', 'name', 'barcode',
-                     'paid', 'product', 'price', 'stock']
-        )
+        return fingerprint
 
-        full_data["date"] = pd.to_datetime(full_data["date"])
+    @dashapp.callback(
+        [Output("debt_table", "data"),
+         Output("debt_table", "page_count")],
+        [Input("shared_data", "children"),
+         Input("debt_table", "page_current"),
+         Input("debt_table", "page_size"),
+         Input("debt_table", "sort_by"),
+         Input("debt_table", "filter_query")]
+    )
+    def update_debts(shared_data, page_current, page_size, sort_by,
+                     filter_query):
+        """Update debt table.
+
+        Paging, sorting and filtering happen on the server, so only the
+        visible page is sent to the browser.
+
+        Parameters
+        ----------
+        shared_data : str
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the debts are read from the data store.
+        page_current : int
+            Index of the current page.
+        page_size : int
+            Number of rows per page.
+        sort_by : list of dict
+            Sort columns and directions of the table.
+        filter_query : str
+            Filter expression of the table.
+
+        Returns
+        -------
+        debts : dict
+            Debt table of the current page.
+        page_count : int
+            Total number of pages.
+
+        """
+        debts = datastore.get_store().debts()
+        debts = filter_table(debts, filter_query)
 
-        full_data = full_data.to_json()
+        if sort_by:
+            debts = debts.sort_values(
+                [col['column_id'] for col in sort_by],
+                ascending=[col['direction'] == 'asc' for col in sort_by],
+                ignore_index=True
+            )
 
-        return full_data
+        page_current = page_current or 0
+        page_count = max(1, -(-len(debts) // page_size))
+        page = debts.iloc[page_current * page_size:
+                          (page_current + 1) * page_size]
+
+        return page.to_dict("records"), page_count
 
     @dashapp.callback(
-        Output("debt_table", "data"),
-        [Input("shared_data", "children")]
+        [Output("debt_table", "active_cell"),
+         Output("debt_table", "selected_cells")],
+        [Input("debt_table", "page_current"),
+         Input("debt_table", "sort_by"),
+         Input("debt_table", "filter_query")]
     )
-    def update_debts(shared_data):
-        """Update debt table.
+    def reset_debt_selection(page_current, sort_by, filter_query):
+        """Deselect the person when other rows of the debt table are shown.
+
+        The selected cell is a row index of the shown page, it would select
+        another person once the page, sorting or filter change.
+
+        Parameters
+        ----------
+        page_current : int
+            Index of the current page.
+        sort_by : list of dict
+            Sort columns and directions of the table.
+        filter_query : str
+            Filter expression of the table.
+
+        Returns
+        -------
+        active_cell : None
+            No selected cell.
+        selected_cells : list
+            No selected cells.
+
+        """
+        return None, []
+
+    @dashapp.callback(
+        [Output("debt_details_title", "children"),
+         Output("debt_details", "data")],
+        [Input("shared_data", "children"),
+         Input("debt_table", "active_cell")],
+        [State("debt_table", "data")]
+    )
+    def update_debt_details(shared_data, active_cell, debts):
+        """Show the unpaid purchases of the selected person.
 
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the items are read from the data store.
+        active_cell : dict
+            Selected cell of the debt table.
+        debts : list of dict
+            Rows of the currently shown page of the debt table.
 
         Returns
         -------
-        debts : dict
-            Debt table.
+        title : str
+            Title of the detail table.
+        items : list of dict
+            Unpaid purchases of the selected person.
 
         """
-        df = pd.read_json(shared_data)
+        if not active_cell or active_cell['row'] >= len(debts):
+            return "", []
 
-        debts = df[df["paid"] == 0].groupby(["name"])["price"].agg("sum")
-        debts = debts.sort_values(ascending=False)
-        debts = debts.reset_index()
+        name = debts[active_cell['row']]['name']
+        items = datastore.get_store().unpaid_items(name)
+        items = items.assign(date=items['date'].dt.strftime('%d.%m.%Y %H:%M'))
 
-        return debts.to_dict("records")
+        return "Offene Käufe: {}".format(name), items.to_dict("records")
 
     @dashapp.callback(
         [Output("info-box-revenue-title", "children"),
@@ -97,7 +198,8 @@ def register_callbacks(dashapp):
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day. Only used
+            as a trigger, the purchases are read from the data store.
 
         Returns
         -------
@@ -107,10 +209,14 @@ def register_callbacks(dashapp):
             Value of the info box.
 
         """
-        df = pd.read_json(shared_data)
+        store = datastore.get_store()
+        df = store.full_data()
 
-        date = df["date"].min().date()
-        revenue = df.dropna()['price'].sum()
+        date = aggregates.first_date(df, store.hours).date()
+        purchases = aggregates.weighted_purchases(
+            df, store.summary, store.products
+        ).dropna()
+        revenue = (purchases['price'] * purchases['count']).sum()
 
         title = "Umsatz seit {}".format(date.strftime("%d.%m.%Y"))
         value = "{:.2f} €".format(revenue)
@@ -127,7 +233,8 @@ def register_callbacks(dashapp):
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day. Only used
+            as a trigger, the purchases are read from the data store.
 
         Returns
         -------
@@ -135,8 +242,12 @@ def register_callbacks(dashapp):
             Value of the info box.
 
         """
-        df = pd.read_json(shared_data)
-        counts = df['name'].value_counts()
+        store = datastore.get_store()
+        df = store.full_data()
+        purchases = aggregates.weighted_purchases(
+            df, store.summary, store.products
+        )
+        counts = purchases.groupby('name')['count'].sum()
 
         value = "{:s} ({:d} St.)".format(counts.idxmax(), counts.max())
 
@@ -147,12 +258,17 @@ def register_callbacks(dashapp):
         [Input("shared_data", "children")]
     )
     def update_bestseller(shared_data):
-        """Update info box for the person with the most drinks.
+        """Update info box for the most purchased product of this month.
+
+        Only the purchases of the current month are read from the purchase
+        file, located via its date index.
 
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the purchases are read from the data
+            store.
 
         Returns
         -------
@@ -160,12 +276,12 @@ def register_callbacks(dashapp):
             Value of the info box.
 
         """
-        df = pd.read_json(shared_data)
-
-        this_month = pd.Timestamp.now().month
+        month_start = pd.Timestamp.now().normalize().replace(day=1)
+        df = datastore.get_store().purchases_between(
+            month_start.to_pydatetime()
+        )
 
-        mask = (df['date'].dt.month == this_month)
-        counts = df[mask].groupby("product").size()
+        counts = df.groupby("product").size()
         try:
             value = counts.idxmax()
         except ValueError:
@@ -184,107 +300,173 @@ def register_callbacks(dashapp):
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day. Only used
+            as a trigger, the purchases are read from the data store.
         filter_time_by : str
             One of the following options:
                 - ''
                 - 'month'
                 - 'weekday'
                 - 'hour'
+                - 'heatmap' (hour and weekday)
 
         Returns
         -------
         plot : plotly.graph_objects.Figure
-            Scatter plot showing the number of purchases per day.
+            Scatter plot showing the number of purchases per day, bar chart
+            of the grouped purchases or heatmap of hour and weekday.
 
         """
-        df = pd.read_json(shared_data)
+        store = datastore.get_store()
+        df = aggregates.weighted_times(store.full_data(), store.hours)
 
         # no filter -> default to timeline
         if filter_by == 'no_filter':
-            purch = df.groupby(df['date'].dt.date).size()
+            purch = df.groupby(df['date'].dt.date)['count'].sum()
             fig = plot_utils.plot_timeline(purch)
-            return fig
+            return encoding.compact(fig)
+
+        elif filter_by == 'heatmap':
+            purch = aggregates.count_per_hour_and_weekday(df)
+            return encoding.compact(plot_utils.plot_hour_weekday(purch))
 
         # apply various filters
-        elif filter_by == 'hour':
-            purch = df.groupby(df['date'].dt.hour).size()
-        elif filter_by == 'weekday':
-            purch = df.groupby(df['date'].dt.day_name('de_DE.UTF-8')).size()
-            sort_mask = ['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag',
-                         'Freitag', 'Samstag', 'Sonntag']
-            purch = purch.reindex(sort_mask)
-        elif filter_by == 'month':
-            purch = df.groupby(df['date'].dt.month_name('de_DE.UTF-8')).size()
-            sort_mask = ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni',
-                         'Juli', 'August', 'September', 'Oktober', 'November',
-                         'Dezember']
-            purch = purch.reindex(sort_mask)
+        elif filter_by in ('hour', 'weekday', 'month'):
+            purch = aggregates.count_per(df, filter_by)
         else:
             raise ValueError('Unknown filter {}'.format(filter_by))
 
         fig = plot_utils.plot_purch_per_time(purch, filter_by)
 
-        return fig
+        return encoding.compact(fig)
 
     @dashapp.callback(
-        Output("inventory", "figure"),
-        [Input("shared_data", "children")]
+        [Output("inventory", "figure"),
+         Output("inventory_page", "max_value"),
+         Output("inventory_page", "style")],
+        [Input("shared_data", "children"),
+         Input("inventory_page", "active_page"),
+         Input("detail_tabs", "active_tab"),
+         Input("details_visible", "n_clicks")]
     )
-    def update_inventory(shared_data):
+    def update_inventory(shared_data, page, active_tab, visible):
         """Update inventory chart.
 
+        Shows one page of the products with the largest stock, the stock
+        of the products on the following pages is summed up in a single
+        bar. Each bar shows the forecast days until the product runs out,
+        products to reorder are highlighted.
+
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the products are read from the data
+            store.
+        page : int
+            Selected page of the chart.
+        active_tab : str
+            ID of the active detail tab.
+        visible : int
+            Larger than zero once the detail tabs have been scrolled into
+            view.
 
         Returns
         -------
         plot : plotly.graph_objects.Figure
             Bar chart showing the number of remaining items.
+        page_count : int
+            Number of pages.
+        style : dict
+            Style of the pagination, hidden for a single page.
 
         """
-        df = pd.read_json(shared_data)
-
-        stock = df.groupby('product')[['stock', 'price']].first()
-        remaining = stock.sort_index(ascending=False)
+        require_visible('tab-overview', active_tab, visible)
+
+        # current prices, the purchases carry their historic prices
+        store = datastore.get_store()
+        stock = store.products.groupby('product')[['stock', 'price']].first()
+        forecast = store.forecast().groupby('product')[
+            ['days_left', 'reorder']
+        ].first()
+
+        selected, _, page_count = aggregates.top_n(stock['stock'],
+                                                   CHART_ROWS, page)
+        remaining = stock.join(forecast).reindex(selected.index).assign(
+            stock=selected
+        )
 
         plot = plot_utils.plot_inventory_chart(remaining)
 
-        return plot
+        return encoding.compact(plot), page_count, pagination_style(page_count)
 
     @dashapp.callback(
-        Output("statistics", "figure"),
+        [Output("statistics", "figure"),
+         Output("statistics_page", "max_value"),
+         Output("statistics_page", "style")],
         [Input("shared_data", "children"),
-         Input("stats_switch", "value")]
+         Input("stats_switch", "value"),
+         Input("statistics_page", "active_page"),
+         Input("detail_tabs", "active_tab"),
+         Input("details_visible", "n_clicks")]
     )
-    def update_chart(shared_data, relative_drinks):
+    def update_chart(shared_data, relative_drinks, page, active_tab,
+                     visible):
         """Update inventory chart.
 
+        Shows one page of the persons with the most drinks, the persons on
+        the following pages are summed up in a single bar.
+
         Parameters
         ----------
         shared_data : str
-            JSON serialized pandas data frame containing purchase data.
+            Fingerprint of the data files and the current day. Only used
+            as a trigger, the purchases are read from the data store.
         relative_drinks : boolean
             True to show number of each drink per each person.
+        page : int
+            Selected page of the chart.
+        active_tab : str
+            ID of the active detail tab.
+        visible : int
+            Larger than zero once the detail tabs have been scrolled into
+            view.
 
         Returns
         -------
         plot : plotly.graph_objects.Figure
             Bar chart showing the number of remaining items.
+        page_count : int
+            Number of pages.
+        style : dict
+            Style of the pagination, hidden for a single page.
 
         """
-        df = pd.read_json(shared_data)
+        require_visible('tab-overview', active_tab, visible)
+
+        store = datastore.get_store()
+        df = store.full_data()
+        df = aggregates.weighted_purchases(df, store.summary, store.products)
 
         # How many drinks of each product did a person have?
-        grouped_df = df.groupby(["name", "product"]).size()
+        grouped_df = df.groupby(["name", "product"])['count'].sum()
 
-        # Product names of all consumed products
-        products = grouped_df.groupby("product").groups.keys()
+        # Total number of drinks per person, only one page is shown
+        abs_drinks_per_person, others, page_count = aggregates.top_n(
+            grouped_df.groupby(level=0).sum(), CHART_ROWS, page
+        )
 
-        # Total number of drinks per person
-        abs_drinks_per_person = grouped_df.groupby(level=0).sum().sort_values()
+        # sum up the drinks of the following pages, drop previous pages
+        names = grouped_df.index.get_level_values("name")
+        shown = names.isin(abs_drinks_per_person.index)
+        kept = shown | names.isin(others)
+        grouped_df = grouped_df[kept].groupby([
+            names.where(shown, aggregates.OTHER)[kept],
+            grouped_df.index.get_level_values("product")[kept]
+        ]).sum()
+
+        # Product names of all consumed products
+        products = grouped_df.groupby(level=1).groups.keys()
 
         # calculate percentage of each drink for each person
         rel_drinks_per_person = {}
@@ -299,4 +481,223 @@ def register_callbacks(dashapp):
         else:
             plot = plot_utils.plot_abs_drinks_per_person(abs_drinks_per_person)
 
-        return plot
+        return encoding.compact(plot), page_count, pagination_style(page_count)
+
+    @dashapp.callback(
+        Output("person_select", "options"),
+        [Input("shared_data", "children"),
+         Input("detail_tabs", "active_tab"),
+         Input("details_visible", "n_clicks")]
+    )
+    def update_person_options(shared_data, active_tab, visible):
+        """Update the list of persons of the detail view.
+
+        Parameters
+        ----------
+        shared_data : str
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the names are read from the data store.
+        active_tab : str
+            ID of the active detail tab.
+        visible : int
+            Larger than zero once the detail tabs have been scrolled into
+            view.
+
+        Returns
+        -------
+        options : list of dict
+            Dropdown options.
+
+        """
+        require_visible('tab-person', active_tab, visible)
+
+        return [{'label': name, 'value': name}
+                for name in datastore.get_store().names()]
+
+    @dashapp.callback(
+        [Output("person_history", "figure"),
+         Output("person_products", "figure")],
+        [Input("shared_data", "children"),
+         Input("person_select", "value"),
+         Input("detail_tabs", "active_tab"),
+         Input("details_visible", "n_clicks")]
+    )
+    def update_person(shared_data, name, active_tab, visible):
+        """Update the detail view of a single person.
+
+        Only the purchases of the selected person are looked up via the
+        per-person index of the data store.
+
+        Parameters
+        ----------
+        shared_data : str
+            Fingerprint of the data files and the current day.
+            Only used as a trigger, the purchases are read from the data
+            store.
+        name : str
+            Selected person.
+        active_tab : str
+            ID of the active detail tab.
+        visible : int
+            Larger than zero once the detail tabs have been scrolled into
+            view.
+
+        Returns
+        -------
+        history : plotly.graph_objects.Figure
+            Paid and unpaid purchases per month.
+        products : plotly.graph_objects.Figure
+            Number of purchases per product.
+
+        """
+        require_visible('tab-person', active_tab, visible)
+
+        if not name:
+            return {}, {}
+
+        store = datastore.get_store()
+        df = store.person_purchases(name)
+        # compacted purchases are paid
+        summary = store.person_summary(name)
+
+        month = df['date'].dt.to_period('M').dt.to_timestamp()
+        history = df.groupby([month, df['paid'] == 0]).size()
+        history = history.unstack(fill_value=0).reindex(
+            columns=[False, True], fill_value=0
+        )
+        history.columns = ['paid', 'unpaid']
+        history = history.add(
+            summary.groupby('month')['count'].sum().to_frame('paid')
+            .assign(unpaid=0),
+            fill_value=0
+        ).astype(int).sort_index()
+
+        products = df.groupby('product').size().add(
+            summary.groupby('product')['count'].sum(), fill_value=0
+        ).astype(int).sort_values()
+
+        return (encoding.compact(plot_utils.plot_person_history(history)),
+                encoding.compact(plot_utils.plot_product_mix(products)))
+
+
+def require_visible(tab_id, active_tab, visible):
+    """Skip the update of content that is currently not shown.
+
+    Parameters
+    ----------
+    tab_id : str
+        ID of the detail tab containing the updated content.
+    active_tab : str
+        ID of the active detail tab.
+    visible : int
+        Larger than zero once the detail tabs have been scrolled into view.
+
+    Raises
+    ------
+    dash.exceptions.PreventUpdate
+        If the tab is not active or has not been scrolled into view yet.
+        The callback runs again once the tab is opened.
+
+    """
+    if not visible or active_tab != tab_id:
+        raise PreventUpdate
+
+
+def pagination_style(page_count):
+    """Hide the pagination of a chart with a single page.
+
+    Parameters
+    ----------
+    page_count : int
+        Number of pages of the chart.
+
+    Returns
+    -------
+    style : dict
+        Style of the pagination component.
+
+    """
+    if page_count > 1:
+        return {'justify-content': 'center'}
+    return {'display': 'none'}
+
+
+def split_filter_part(filter_part):
+    """Split a single dash table filter expression.
+
+    Parameters
+    ----------
+    filter_part : str
+        Expression like ``{price} > 5``.
+
+    Returns
+    -------
+    column : str
+        Column ID, None if the expression can not be parsed.
+    operator : str
+        Operator name (e.g. ``'ge'``).
+    value : str or float
+        Value to compare with.
+
+    """
+    # the operator follows the column ID, the value may contain operators
+    name_end = filter_part.find('}')
+    if name_end < 0:
+        return None, None, None
+    name = filter_part[filter_part.find('{') + 1:name_end]
+    operator_part = filter_part[name_end + 1:].lstrip()
+
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator_part.startswith(operator):
+                value_part = operator_part[len(operator):].strip()
+                quote = value_part[:1]
+                if quote in ("'", '"', '`') and value_part[-1] == quote:
+                    value = value_part[1:-1].replace('\\' + quote, quote)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def filter_table(df, filter_query):
+    """Apply a dash table filter query to a data frame.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Table data.
+    filter_query : str
+        Filter expression of the table, parts joined by `` && ``.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        Rows matching the filter.
+
+    """
+    if not filter_query:
+        return df
+
+    comparisons = {'eq': '__eq__', 'ne': '__ne__', 'lt': '__lt__',
+                   'le': '__le__', 'gt': '__gt__', 'ge': '__ge__'}
+
+    for filter_part in filter_query.split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in df:
+            continue
+
+        if operator in comparisons:
+            mask = getattr(df[column], comparisons[operator])(value)
+        elif operator == 'contains':
+            mask = df[column].astype(str).str.contains(
+                str(value), case=False, regex=False
+            )
+        df = df.loc[mask]
+
+    return df
@@ -0,0 +1,171 @@
+"""Replay of the dash callback graph outside of the browser.
+
+The snapshot export (``snapshot.py``) and the load test
+(``benchmarks/loadtest.py``) resolve the callbacks of the dashboard the way
+the dash renderer does: the initial properties are taken from the layout,
+every callback whose inputs are not waiting for another callback runs, and
+every changed property triggers the callbacks depending on it. How a
+callback request is sent is up to the caller.
+"""
+
+
+def load(layout, dependencies):
+    """Prepare the callback graph of a dash app.
+
+    Parameters
+    ----------
+    layout : dict
+        Response of ``_dash-layout``.
+    dependencies : list of dict
+        Response of ``_dash-dependencies``.
+
+    Returns
+    -------
+    props : dict
+        Maps (id, property) to the initial values of the layout.
+    callbacks : list of dict
+        Callbacks run on the server with their parsed ``outputs`` and
+        ``input_keys``. Clientside callbacks run in the browser only and
+        are skipped.
+
+    """
+    props = {}
+    collect_props(layout, props)
+
+    callbacks = [callback for callback in dependencies
+                 if not callback.get('clientside_function')]
+    for callback in callbacks:
+        callback['outputs'] = parse_outputs(callback['output'])
+        callback['input_keys'] = [(i['id'], i['property'])
+                                  for i in callback['inputs']]
+    return props, callbacks
+
+
+def dispatch(callbacks, pending, call):
+    """Run callbacks in dependency order like the dash renderer.
+
+    Parameters
+    ----------
+    callbacks : list of dict
+        All callbacks of the dashboard, see :func:`load`.
+    pending : list of dict
+        Callbacks to run first, their dependents follow.
+    call : callable
+        Runs a single callback and returns the set of (id, property) pairs
+        it changed.
+
+    """
+    pending = list(pending)
+    while pending:
+        waiting = {output for callback in pending
+                   for output in callback['outputs']}
+        ready = [callback for callback in pending
+                 if not waiting.intersection(callback['input_keys'])]
+        if not ready:
+            ready = pending[:1]
+
+        changed = set()
+        for callback in ready:
+            pending.remove(callback)
+            changed.update(call(callback))
+
+        for callback in triggered(callbacks, changed):
+            if callback not in pending:
+                pending.append(callback)
+
+
+def triggered(callbacks, changed):
+    """Return the callbacks with an input in ``changed``.
+
+    Parameters
+    ----------
+    callbacks : list of dict
+        All callbacks of the dashboard.
+    changed : set of tuple
+        Changed (id, property) pairs.
+
+    Returns
+    -------
+    callbacks : list of dict
+        Callbacks to run.
+
+    """
+    return [callback for callback in callbacks
+            if changed.intersection(callback['input_keys'])]
+
+
+def request(callback, props):
+    """Build the body of a ``_dash-update-component`` request.
+
+    Parameters
+    ----------
+    callback : dict
+        Callback to run.
+    props : dict
+        Maps (id, property) to the current values.
+
+    Returns
+    -------
+    body : dict
+        JSON body of the request.
+
+    """
+    outputs = [{'id': ident, 'property': prop}
+               for ident, prop in callback['outputs']]
+    return {
+        'output': callback['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [dict(i, value=props.get((i['id'], i['property'])))
+                   for i in callback['inputs']],
+        'state': [dict(s, value=props.get((s['id'], s['property'])))
+                  for s in callback['state']],
+        'changedPropIds': ['{}.{}'.format(*key)
+                           for key in callback['input_keys']],
+    }
+
+
+def update(props, response):
+    """Store the outputs of a callback response.
+
+    Parameters
+    ----------
+    props : dict
+        Maps (id, property) to the current values, updated in place.
+    response : dict
+        JSON body of the response.
+
+    Returns
+    -------
+    changed : set of tuple
+        (id, property) pairs updated by the callback.
+
+    """
+    changed = set()
+    for ident, values in response['response'].items():
+        for prop, value in values.items():
+            props[(ident, prop)] = value
+            changed.add((ident, prop))
+    return changed
+
+
+def parse_outputs(output):
+    """Split the output string of a dependency into (id, property) pairs."""
+    if output.startswith('..'):
+        parts = output[2:-2].split('...')
+    else:
+        parts = [output]
+    return [tuple(part.rsplit('.', 1)) for part in parts]
+
+
+def collect_props(component, props):
+    """Collect the initial properties of all components with an ID."""
+    if isinstance(component, list):
+        for child in component:
+            collect_props(child, props)
+    elif isinstance(component, dict) and 'props' in component:
+        ident = component['props'].get('id')
+        for prop, value in component['props'].items():
+            if ident is not None:
+                props[(ident, prop)] = value
+            if isinstance(value, (dict, list)):
+                collect_props(value, props)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Roll old, settled purchases into monthly summaries.
+
+Every callback scans the whole ``purchase.txt``, although anything older
+than a few months only contributes to counts and sums. This tool moves
+paid purchases older than a horizon out of the purchase file into two
+summary tables next to it:
+
+- ``<purchase>-summary.txt`` with ``month,name,barcode,count`` (purchases
+  per month, person and product),
+- ``<purchase>-hours.txt`` with ``date,hour,count`` (purchases per day and
+  hour, for the timeline).
+
+The moved lines are appended to ``<purchase>-archive.txt``, unpaid
+purchases are never compacted. Only complete months are compacted, so the
+current month always stays in the purchase file. The dashboard aggregates
+from the summaries plus the remaining purchases and shows the same numbers
+as before.
+
+Usage (ideally while nobody is scanning, e.g. from a nightly cron job)::
+
+    python compact.py --horizon 90
+
+The files are replaced via a journal, an interrupted compaction is
+completed on the next run.
+"""
+import argparse
+import io
+import json
+import os
+
+import pandas as pd
+
+PURCHASE_COLUMNS = ['date', 'name', 'barcode', 'paid']
+SUMMARY_COLUMNS = ['month', 'name', 'barcode', 'count']
+HOURS_COLUMNS = ['date', 'hour', 'count']
+
+
+def summary_paths(purchase_file):
+    """Return the paths of the files written by the compaction.
+
+    Parameters
+    ----------
+    purchase_file : str
+        Path to ``purchase.txt``.
+
+    Returns
+    -------
+    paths : dict
+        Paths of the ``summary``, ``hours`` and ``archive`` files and of the
+        ``journal``.
+
+    """
+    base = os.path.splitext(purchase_file)[0]
+    return {
+        'summary': base + '-summary.txt',
+        'hours': base + '-hours.txt',
+        'archive': base + '-archive.txt',
+        'journal': base + '-compaction.json',
+    }
+
+
+def read_summaries(purchase_file):
+    """Read the summary tables of a purchase file.
+
+    Parameters
+    ----------
+    purchase_file : str
+        Path to ``purchase.txt``.
+
+    Returns
+    -------
+    summary : pandas.DataFrame
+        Purchases per ``month`` (first day of the month), ``name`` and
+        ``barcode``.
+    hours : pandas.DataFrame
+        Purchases per ``date`` (day) and ``hour``.
+
+    """
+    paths = summary_paths(purchase_file)
+    summary, hours = empty_summaries()
+
+    if os.path.exists(paths['summary']):
+        summary = pd.read_csv(paths['summary'], header=None,
+                              names=SUMMARY_COLUMNS)
+        summary['month'] = pd.to_datetime(summary['month'], format='%Y-%m')
+
+    if os.path.exists(paths['hours']):
+        hours = pd.read_csv(paths['hours'], header=None, names=HOURS_COLUMNS)
+        hours['date'] = pd.to_datetime(hours['date'], format='%Y-%m-%d')
+
+    return summary, hours
+
+
+def empty_summaries():
+    """Return empty summary tables.
+
+    Returns
+    -------
+    summary : pandas.DataFrame
+        Empty table of purchases per month, person and product.
+    hours : pandas.DataFrame
+        Empty table of purchases per day and hour.
+
+    """
+    summary = pd.DataFrame({
+        'month': pd.Series(dtype='datetime64[ns]'),
+        'name': pd.Series(dtype=object),
+        'barcode': pd.Series(dtype='int64'),
+        'count': pd.Series(dtype='int64'),
+    })
+    hours = pd.DataFrame({
+        'date': pd.Series(dtype='datetime64[ns]'),
+        'hour': pd.Series(dtype='int64'),
+        'count': pd.Series(dtype='int64'),
+    })
+    return summary, hours
+
+
+def compact(purchase_file, horizon_days, now=None):
+    """Move paid purchases older than the horizon into the summaries.
+
+    Parameters
+    ----------
+    purchase_file : str
+        Path to ``purchase.txt``.
+    horizon_days : int
+        Purchases older than this many days are compacted, rounded down to
+        the start of the month.
+    now : pandas.Timestamp, optional
+        Reference time, defaults to the current time.
+
+    Returns
+    -------
+    compacted : int
+        Number of compacted purchases.
+
+    """
+    paths = summary_paths(purchase_file)
+    finish(paths)
+
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    cutoff = (now - pd.Timedelta(days=horizon_days)).normalize()
+    cutoff = cutoff.replace(day=1)
+
+    with open(purchase_file, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        content = f.read()
+
+    lines = content.splitlines(keepends=True)
+    purchases = pd.read_csv(io.BytesIO(content), header=None,
+                            names=PURCHASE_COLUMNS, skip_blank_lines=False)
+    if len(purchases) != len(lines):
+        raise ValueError('Could not parse {}'.format(purchase_file))
+
+    dates = pd.to_datetime(purchases['date'], errors='coerce')
+    mask = ((purchases['paid'] == 1) & (dates < cutoff)
+            & purchases['name'].notna() & purchases['barcode'].notna())
+    mask = mask.to_numpy()
+    if not mask.any():
+        return 0
+
+    old = purchases[mask].assign(date=dates[mask])
+    summary, hours = read_summaries(purchase_file)
+
+    new_summary = old.groupby(
+        [old['date'].dt.to_period('M').dt.to_timestamp(), 'name', 'barcode']
+    ).size().rename('count').reset_index().rename(columns={'date': 'month'})
+    summary = pd.concat([summary, new_summary]).groupby(
+        ['month', 'name', 'barcode'], as_index=False
+    )['count'].sum()
+
+    new_hours = old.groupby(
+        [old['date'].dt.normalize(), old['date'].dt.hour.rename('hour')]
+    ).size().rename('count').reset_index()
+    hours = pd.concat([hours, new_hours]).groupby(
+        ['date', 'hour'], as_index=False
+    )['count'].sum()
+
+    # write everything next to the targets, then swap via the journal
+    replacements = {
+        paths['summary']: summary.assign(
+            month=summary['month'].dt.strftime('%Y-%m')
+        ).to_csv(header=False, index=False).encode(),
+        paths['hours']: hours.assign(
+            date=hours['date'].dt.strftime('%Y-%m-%d')
+        ).to_csv(header=False, index=False).encode(),
+        purchase_file: b''.join(
+            line for line, compacted in zip(lines, mask) if not compacted
+        ),
+    }
+    archive = b''
+    if os.path.exists(paths['archive']):
+        with open(paths['archive'], 'rb') as f:
+            archive = f.read()
+    if archive and not archive.endswith(b'\n'):
+        archive += b'\n'
+    replacements[paths['archive']] = archive + b''.join(
+        line if line.endswith(b'\n') else line + b'\n'
+        for line, compacted in zip(lines, mask) if compacted
+    )
+
+    for path, data in replacements.items():
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+
+    # do not lose purchases scanned in the meantime
+    latest = os.stat(purchase_file)
+    if (latest.st_size, latest.st_mtime_ns) \
+            != (stat.st_size, stat.st_mtime_ns):
+        for path in replacements:
+            os.remove(path + '.tmp')
+        raise RuntimeError(
+            '{} changed during the compaction, try again'.format(
+                purchase_file)
+        )
+
+    with open(paths['journal'], 'w') as f:
+        json.dump(list(replacements), f)
+    finish(paths)
+
+    return int(mask.sum())
+
+
+def finish(paths):
+    """Complete an interrupted compaction.
+
+    Parameters
+    ----------
+    paths : dict
+        Output of :func:`summary_paths`.
+
+    """
+    if not os.path.exists(paths['journal']):
+        return
+
+    with open(paths['journal']) as f:
+        targets = json.load(f)
+    for path in targets:
+        if os.path.exists(path + '.tmp'):
+            os.replace(path + '.tmp', path)
+    os.remove(paths['journal'])
+
+
+def main():
+    """Compact the purchase file given by ``PURCHASE_FILE``."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--horizon', type=int, default=90,
+                        help='compact paid purchases older than this many '
+                             'days (default: 90)')
+    parser.add_argument('--purchase-file', default=os.getenv('PURCHASE_FILE'),
+                        help='defaults to PURCHASE_FILE')
+    args = parser.parse_args()
+
+    compacted = compact(args.purchase_file, args.horizon)
+    print('Compacted {} purchases of {}'.format(compacted,
+                                                args.purchase_file))
+
+
+if __name__ == '__main__':
+    main()
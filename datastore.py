@@ -0,0 +1,744 @@
+"""Server-side cache of the barcodeRaspi data files."""
+import glob
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .compact import empty_summaries, read_summaries, summary_paths
+from .dateindex import DateIndex
+from .forecast import ConsumptionRates, forecast
+from .ingest import (PRODUCT_SCHEMA, PURCHASE_SCHEMA, QUARANTINE_SUFFIX,
+                     engine, parse, quarantine, tolerant)
+from .pricehistory import PriceHistory, default_path
+
+PURCHASE_COLUMNS = ['date', 'name', 'barcode', 'paid']
+PRODUCT_COLUMNS = ['id', 'barcode', 'product', 'price', 'stock']
+
+# archives parsed in worker processes, smaller ones are parsed faster
+# than the workers start
+PARALLEL_MIN_BYTES = 64 * 2 ** 20
+
+
+class PurchaseStore:
+    """Parsed purchase and product data shared by all callbacks.
+
+    The files are only parsed again if they changed on disk. Since
+    barcodeRaspi appends new purchases to the end of ``purchase.txt``, only
+    the appended lines are parsed as long as the previously read part of the
+    file is unchanged. Rewrites (e.g. when debts are marked as paid) trigger
+    a full reload. Each change increments ``version``. Unlike the version,
+    ``fingerprint`` (a digest of the file signatures) is the same in all
+    processes reading the same files.
+
+    Two indices map each name to the sorted row positions of their
+    purchases, so that per-person queries cost O(purchases of that person)
+    instead of O(all purchases):
+
+    - ``person_rows``: all purchases
+    - ``unpaid_rows``: unpaid purchases
+
+    Purchases are valued at the price valid at the time of the purchase,
+    looked up in a history of the product prices (see
+    :class:`PriceHistory`) that is extended whenever ``produkt.txt``
+    changes. Appended purchases are looked up on their own, all purchases
+    only if a price changed.
+
+    The daily consumption of each product (see :class:`ConsumptionRates`)
+    is updated with every batch of appended purchases.
+
+    Purchases rolled into monthly summaries by ``compact.py`` are available
+    as ``summary`` (purchases per month, person and product) and ``hours``
+    (purchases per day and hour). Both are empty without compaction.
+
+    Rotated or archived purchase files (e.g. ``purchase.txt.1`` or
+    ``purchase-2021.txt``) matching ``archive_pattern`` are parsed in
+    parallel worker processes and prepended to the purchases in
+    chronological order. Each archive is only parsed again if it changed.
+    The archives are parsed without holding the lock of the store, so other
+    threads keep using the current data in the meantime.
+
+    Parameters
+    ----------
+    purchase_file : str, optional
+        Path to ``purchase.txt``. Defaults to the ``PURCHASE_FILE``
+        environment variable at the time of the first refresh.
+    product_file : str, optional
+        Path to ``produkt.txt``. Defaults to the ``PRODUCT_FILE``
+        environment variable at the time of the first refresh.
+    archive_pattern : str, optional
+        Glob pattern of archived purchase files, several patterns are
+        separated by ``os.pathsep``. Defaults to the ``PURCHASE_ARCHIVES``
+        environment variable at the time of the first refresh.
+
+    """
+
+    def __init__(self, purchase_file=None, product_file=None,
+                 archive_pattern=None):
+        self.purchase_file = purchase_file
+        self.product_file = product_file
+        self.archive_pattern = archive_pattern
+        self.version = 0
+        self.fingerprint = None
+        self.purchases = pd.DataFrame(
+            columns=PURCHASE_COLUMNS + ['product', 'price']
+        )
+        self.products = pd.DataFrame(columns=PRODUCT_COLUMNS)
+        self.prices = None
+        self.rates = ConsumptionRates()
+        self.person_rows = {}
+        self.unpaid_rows = {}
+        self.summary, self.hours = empty_summaries()
+        # purchases of the archives, the first rows of ``purchases``
+        self.archived = _parse_purchases(b'')
+        self._archives = {}
+        # fingerprint and result of the last full_data call
+        self._full_data = (None, None)
+        self._lock = threading.Lock()
+        self._date_index = None
+        self._product_signature = None
+        self._purchase_signature = None
+        self._summary_signature = None
+        # number of parsed bytes and their digest
+        self._offset = 0
+        self._digest = None
+
+    def refresh(self):
+        """Read changes of the data files.
+
+        Returns
+        -------
+        version : int
+            Version of the data after the refresh.
+
+        """
+        purchase_file = self.purchase_file or os.getenv("PURCHASE_FILE")
+        product_file = self.product_file or os.getenv("PRODUCT_FILE")
+        archive_pattern = self.archive_pattern or os.getenv("PURCHASE_ARCHIVES")
+
+        # parse new or changed archives before taking the lock
+        archive_signatures = {
+            path: _file_signature(path)
+            for path in _archive_files(archive_pattern, purchase_file)
+        }
+        with self._lock:
+            stale = self._stale_archives(archive_signatures)
+        parsed = dict(zip(stale, _parse_files(stale)))
+
+        with self._lock:
+            product_signature = _file_signature(product_file)
+            products_changed = product_signature != self._product_signature
+            # barcodeRaspi rewrites the stock with every scan, the purchases
+            # are only looked up again if a price or a name changed
+            prices_changed = names_changed = False
+            if products_changed:
+                products = _read_products(product_file)
+                names_changed = not _product_names(products).equals(
+                    _product_names(self.products)
+                )
+                self.products = products
+                self._product_signature = product_signature
+
+                if (self.prices is None
+                        or self.prices.path != default_path(product_file)):
+                    self.prices = PriceHistory(default_path(product_file))
+                    prices_changed = True
+                # the new prices are valid since the file was written
+                prices_changed |= self.prices.update(
+                    self.products,
+                    pd.Timestamp.fromtimestamp(product_signature[0] / 1e9)
+                )
+
+            archives_changed = archive_signatures != {
+                path: signature
+                for path, (signature, _) in self._archives.items()
+            }
+            if archives_changed:
+                self._merge_archives(archive_signatures, parsed)
+                # reload the purchase file to put it behind the archives
+                self._digest = None
+
+            purchase_signature = _file_signature(purchase_file)
+            purchases_changed = archives_changed or (
+                purchase_signature != self._purchase_signature
+            )
+            if purchases_changed:
+                self._read_purchases(purchase_file)
+                self._purchase_signature = purchase_signature
+
+            paths = summary_paths(purchase_file)
+            summary_signature = (
+                _file_signature(paths['summary'], missing_ok=True),
+                _file_signature(paths['hours'], missing_ok=True),
+            )
+            summary_changed = summary_signature != self._summary_signature
+            if summary_changed:
+                summary, self.hours = read_summaries(purchase_file)
+                self.summary = _attach_products(summary, self.products,
+                                                self.prices, 'month')
+                self._summary_signature = summary_signature
+
+            if prices_changed:
+                self.purchases = _attach_products(
+                    self.purchases[PURCHASE_COLUMNS], self.products,
+                    self.prices
+                )
+                self.summary = _attach_products(
+                    self.summary[['month', 'name', 'barcode', 'count']],
+                    self.products, self.prices, 'month'
+                )
+            elif names_changed:
+                self.purchases = _attach_names(self.purchases, self.products)
+                self.summary = _attach_names(self.summary, self.products)
+
+            if products_changed or purchases_changed or summary_changed:
+                self.version += 1
+                self.fingerprint = hashlib.sha1(repr((
+                    product_signature, purchase_signature,
+                    summary_signature, sorted(archive_signatures.items()),
+                )).encode()).hexdigest()
+
+            return self.version
+
+    def _read_purchases(self, purchase_file):
+        """Parse new lines of the purchase file or reload it entirely."""
+        with open(purchase_file, 'rb') as f:
+            content = f.read()
+
+        # ignore an incomplete last line, it is read on the next refresh
+        end = content.rfind(b'\n') + 1
+
+        prefix_unchanged = (
+            self._digest is not None
+            and end >= self._offset
+            and hashlib.sha1(content[:self._offset]).digest() == self._digest
+        )
+
+        if prefix_unchanged:
+            start = len(self.purchases)
+            new = _parse_purchases(content[self._offset:end], purchase_file)
+            purchases = pd.concat(
+                [self.purchases,
+                 _attach_products(new, self.products, self.prices)],
+                ignore_index=True
+            )
+        else:
+            start = 0
+            new = _parse_purchases(content[:end], purchase_file)
+            if len(self.archived):
+                new = pd.concat([self.archived, new], ignore_index=True)
+            purchases = _attach_products(new, self.products, self.prices)
+
+        # appended purchases are added to the rates of the previous ones
+        if not start:
+            self.rates.reset()
+        self.rates.add(new)
+
+        mask = new["paid"].to_numpy() == 0
+        if start:
+            person_rows = _extend_index(
+                self.person_rows, _index_by_name(new, None), start
+            )
+            unpaid_rows = _extend_index(
+                self.unpaid_rows, _index_by_name(new, mask), start
+            )
+        else:
+            person_rows = _index_by_name(new, None)
+            unpaid_rows = _index_by_name(new, mask)
+
+        self.purchases = purchases
+        self.person_rows = person_rows
+        self.unpaid_rows = unpaid_rows
+        self._offset = end
+        self._digest = hashlib.sha1(content[:end]).digest()
+
+    def _stale_archives(self, signatures):
+        """Return the archives that are new or changed since their parse."""
+        return [path for path, signature in signatures.items()
+                if self._archives.get(path, (None,))[0] != signature]
+
+    def _merge_archives(self, signatures, parsed):
+        """Merge the parsed archives with the unchanged ones.
+
+        Parameters
+        ----------
+        signatures : dict
+            Maps the path of each current archive to its file signature.
+        parsed : dict
+            Purchases of the archives parsed for this refresh. Archives
+            changed by a concurrent refresh in the meantime are parsed
+            again here.
+
+        """
+        for path in self._stale_archives(signatures):
+            if path not in parsed:
+                parsed[path] = _read_purchase_file(path)
+
+        self._archives = {
+            path: (signature, parsed[path] if path in parsed
+                   else self._archives[path][1])
+            for path, signature in signatures.items()
+        }
+
+        # rotated files are named in no particular order, sort by date
+        frames = sorted(
+            (frame for _, frame in self._archives.values() if len(frame)),
+            key=lambda frame: frame['date'].iloc[0]
+        )
+        if frames:
+            self.archived = pd.concat(frames, ignore_index=True)
+        else:
+            self.archived = _parse_purchases(b'')
+
+    def full_data(self):
+        """Combine purchases and products into a single data frame.
+
+        The result is computed once per version of the data and shared by
+        all callers, who must not modify it.
+
+        Returns
+        -------
+        full_data : pandas.DataFrame
+            One row per purchase plus one row for each product that has
+            never been purchased, which keeps the inventory complete.
+            Purchases keep their historic price, the other rows show the
+            current price.
+
+        """
+        with self._lock:
+            fingerprint, cached = self._full_data
+            if fingerprint is not None and fingerprint == self.fingerprint:
+                return cached
+            fingerprint = self.fingerprint
+            purchases = self.purchases
+            products = self.products
+
+        full_data = purchases.drop(columns=['product']).merge(
+            products.rename(columns={'price': 'current_price'}),
+            on='barcode',
+            # retain rows for never purchased products to make the
+            # inventory work
+            how='outer',
+        )
+        full_data['price'] = full_data['price'].fillna(
+            full_data['current_price']
+        )
+        full_data = full_data.reindex(
+            columns=['date', 'name', 'barcode',
+                     'paid', 'product', 'price', 'stock']
+        )
+
+        with self._lock:
+            self._full_data = (fingerprint, full_data)
+        return full_data
+
+    def debts(self):
+        """Sum up the unpaid purchases of each person.
+
+        Returns
+        -------
+        debts : pandas.DataFrame
+            Columns ``name``, ``price`` (total debt) and ``items`` (number
+            of unpaid purchases), sorted by descending debt.
+
+        """
+        # the row positions are only valid for the frame they index
+        with self._lock:
+            purchases = self.purchases
+            unpaid_rows = self.unpaid_rows
+
+        prices = purchases["price"].to_numpy(dtype=float)
+        names = list(unpaid_rows)
+        debts = pd.DataFrame({
+            'name': names,
+            'price': [np.nansum(prices[unpaid_rows[name]])
+                      for name in names],
+            'items': [len(unpaid_rows[name]) for name in names],
+        })
+        return debts.sort_values("price", ascending=False,
+                                 ignore_index=True)
+
+    def unpaid_items(self, name):
+        """Return the unpaid purchases of a single person.
+
+        Parameters
+        ----------
+        name : str
+            Name of the person.
+
+        Returns
+        -------
+        items : pandas.DataFrame
+            Unpaid purchases in chronological order.
+
+        """
+        with self._lock:
+            purchases = self.purchases
+            rows = self.unpaid_rows.get(name, np.empty(0, dtype=np.intp))
+        return purchases.iloc[rows][['date', 'product', 'price']]
+
+    def person_purchases(self, name):
+        """Return all purchases of a single person.
+
+        Parameters
+        ----------
+        name : str
+            Name of the person.
+
+        Returns
+        -------
+        purchases : pandas.DataFrame
+            Purchases in chronological order.
+
+        """
+        with self._lock:
+            purchases = self.purchases
+            rows = self.person_rows.get(name, np.empty(0, dtype=np.intp))
+        return purchases.iloc[rows]
+
+    def purchases_between(self, start=None, end=None):
+        """Read the purchases of a date window from the purchase file.
+
+        Only the part of the file containing the window is parsed, located
+        via the sparse date index of the file (see :class:`DateIndex`).
+        Purchases of the archives are taken from memory.
+
+        Parameters
+        ----------
+        start : datetime.datetime, optional
+            First date of the window (inclusive).
+        end : datetime.datetime, optional
+            Last date of the window (inclusive).
+
+        Returns
+        -------
+        purchases : pandas.DataFrame
+            Purchases of the window with product name and price.
+
+        """
+        purchase_file = self.purchase_file or os.getenv("PURCHASE_FILE")
+        with self._lock:
+            if (self._date_index is None
+                    or self._date_index.path != purchase_file):
+                self._date_index = DateIndex(purchase_file)
+            content = self._date_index.read(start, end)
+            products = self.products
+            prices = self.prices
+            archived = self.archived
+
+        purchases = _parse_purchases(content)
+        purchases = purchases[_in_window(purchases, start, end)]
+        if len(archived):
+            purchases = pd.concat(
+                [archived[_in_window(archived, start, end)], purchases],
+                ignore_index=True
+            )
+
+        return _attach_products(purchases, products, prices)
+
+    def forecast(self):
+        """Estimate the days until each product runs out of stock.
+
+        Returns
+        -------
+        forecast : pandas.DataFrame
+            Stock, consumption per day and days left of each product, see
+            :func:`forecast.forecast`.
+
+        """
+        return forecast(self.products, self.rates, pd.Timestamp.now())
+
+    def person_summary(self, name):
+        """Return the compacted purchases of a single person.
+
+        Parameters
+        ----------
+        name : str
+            Name of the person.
+
+        Returns
+        -------
+        summary : pandas.DataFrame
+            Purchases per month and product.
+
+        """
+        return self.summary[self.summary['name'] == name]
+
+    def names(self):
+        """Return the names of everybody who purchased something.
+
+        Returns
+        -------
+        names : list of str
+            Sorted names.
+
+        """
+        with self._lock:
+            person_rows = self.person_rows
+            summary = self.summary
+        return sorted(set(person_rows) | set(summary['name'].dropna()))
+
+
+def _file_signature(path, missing_ok=False):
+    """Return modification time and size of a file.
+
+    Returns None for missing files if ``missing_ok`` is set.
+
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if missing_ok:
+            return None
+        raise
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _in_window(purchases, start, end):
+    """Select the purchases of a date window, bounds are inclusive."""
+    mask = np.ones(len(purchases), dtype=bool)
+    if start is not None:
+        mask &= (purchases["date"] >= start).to_numpy()
+    if end is not None:
+        mask &= (purchases["date"] <= end).to_numpy()
+    return mask
+
+
+def _archive_files(pattern, purchase_file):
+    """Find the archived purchase files matching a glob pattern.
+
+    The purchase file itself, the files of ``compact.py`` (its archive only
+    contains purchases already counted in the summaries), index files and
+    quarantined lines are skipped.
+
+    Parameters
+    ----------
+    pattern : str
+        Glob patterns separated by ``os.pathsep``, may be None.
+    purchase_file : str
+        Path to ``purchase.txt``.
+
+    Returns
+    -------
+    paths : list of str
+        Sorted paths of the archives.
+
+    """
+    if not pattern:
+        return []
+
+    excluded = {os.path.abspath(path) for path in
+                [purchase_file, *summary_paths(purchase_file).values()]}
+    paths = set()
+    for part in pattern.split(os.pathsep):
+        paths.update(glob.glob(os.path.expanduser(part)))
+
+    return sorted(
+        path for path in paths
+        if os.path.isfile(path)
+        and os.path.abspath(path) not in excluded
+        and not path.endswith(('.idx', '.tmp'))
+        and not os.path.splitext(path)[0].endswith(QUARANTINE_SUFFIX)
+    )
+
+
+def _parse_files(paths):
+    """Parse complete purchase files, in parallel if they are large.
+
+    The worker processes are started with ``spawn``, the server runs
+    threads whose locks a forked process would inherit in a held state.
+    Starting them takes about a second (they import this package), so
+    files smaller than ``PARALLEL_MIN_BYTES`` in total are parsed in this
+    process.
+
+    Parameters
+    ----------
+    paths : list of str
+        Paths of purchase files.
+
+    Returns
+    -------
+    purchases : list of pandas.DataFrame
+        Parsed purchases of each file.
+
+    """
+    workers = min(len(paths), os.cpu_count() or 1)
+    size = sum(os.path.getsize(path) for path in paths)
+    if workers < 2 or size < PARALLEL_MIN_BYTES:
+        return [_read_purchase_file(path) for path in paths]
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=context) as executor:
+        return list(executor.map(_read_purchase_file, paths))
+
+
+def _read_purchase_file(path):
+    """Parse a complete purchase file, runs in a worker process."""
+    with open(path, 'rb') as f:
+        return _parse_purchases(f.read(), path)
+
+
+def _read_products(path):
+    """Parse the product file, see :mod:`ingest`."""
+    with open(path, 'rb') as f:
+        products, rejected = parse(f.read(), PRODUCT_SCHEMA, engine(),
+                                   tolerant())
+    quarantine(path, rejected)
+    return products
+
+
+def _parse_purchases(content, path=None):
+    """Parse lines of the purchase file.
+
+    Malformed lines are quarantined next to ``path`` in tolerant mode, see
+    :mod:`ingest`.
+
+    """
+    if not content.strip():
+        return pd.DataFrame({
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'name': pd.Series(dtype=object),
+            'barcode': pd.Series(dtype='int64'),
+            'paid': pd.Series(dtype='int64'),
+        })
+
+    purchases, rejected = parse(content, PURCHASE_SCHEMA, engine(),
+                                tolerant())
+    if path is not None:
+        quarantine(path, rejected)
+    return purchases
+
+
+def _attach_products(purchases, products, prices, date_column='date'):
+    """Look up product name and price of each purchase.
+
+    Parameters
+    ----------
+    purchases : pandas.DataFrame
+        Purchase data.
+    products : pandas.DataFrame
+        Product data, only used for the product names.
+    prices : PriceHistory
+        Price history the prices are looked up in.
+    date_column : str
+        Column with the purchase dates. Summaries are looked up at the
+        start of their month.
+
+    Returns
+    -------
+    purchases : pandas.DataFrame
+        Copy of the purchases with ``product`` and ``price``.
+
+    """
+    lookup = products.drop_duplicates('barcode').set_index('barcode')
+    purchases = purchases.copy()
+    purchases['product'] = purchases['barcode'].map(lookup['product'])
+    purchases['price'] = prices.lookup(purchases['barcode'],
+                                       purchases[date_column])
+    return purchases
+
+
+def _product_names(products):
+    """Return the product name of each barcode, sorted by barcode."""
+    lookup = products.drop_duplicates('barcode').set_index('barcode')
+    return lookup['product'].sort_index()
+
+
+def _attach_names(purchases, products):
+    """Look up the product names of purchases that already have a price.
+
+    Parameters
+    ----------
+    purchases : pandas.DataFrame
+        Purchase data with ``product`` and ``price``.
+    products : pandas.DataFrame
+        Product data.
+
+    Returns
+    -------
+    purchases : pandas.DataFrame
+        Copy of the purchases with the current ``product`` names.
+
+    """
+    purchases = purchases.copy()
+    purchases['product'] = purchases['barcode'].map(_product_names(products))
+    return purchases
+
+
+def _index_by_name(purchases, mask):
+    """Map each name to its sorted row positions selected by ``mask``.
+
+    Parameters
+    ----------
+    purchases : pandas.DataFrame
+        Purchase data.
+    mask : numpy.ndarray or None
+        Boolean row selection, None to select all rows.
+
+    Returns
+    -------
+    index : dict
+        Maps each name to a sorted array of row positions.
+
+    """
+    if mask is None:
+        positions = np.arange(len(purchases))
+    else:
+        positions = np.flatnonzero(mask)
+    names = purchases["name"].to_numpy()[positions]
+    groups = pd.Series(positions).groupby(names).indices
+    return {name: positions[idx] for name, idx in groups.items()}
+
+
+def _extend_index(index, new_index, offset):
+    """Merge the index of appended rows into an existing index.
+
+    Parameters
+    ----------
+    index : dict
+        Index of the existing rows. Not modified.
+    new_index : dict
+        Index of the appended rows, positions relative to the first
+        appended row.
+    offset : int
+        Position of the first appended row.
+
+    Returns
+    -------
+    index : dict
+        Combined index. Only the entries of names with new rows are copied.
+
+    """
+    index = dict(index)
+    for name, rows in new_index.items():
+        rows = rows + offset
+        if name in index:
+            rows = np.concatenate([index[name], rows])
+        index[name] = rows
+    return index
+
+
+# cache shared by all callbacks of this process
+store = PurchaseStore()
+
+
+def get_store():
+    """Return the shared data store, updated with changes of the files.
+
+    Callbacks may run in a different worker process than the interval
+    update, so they refresh the store before using it. Refreshing an up to
+    date store only checks the file signatures.
+
+    Returns
+    -------
+    store : PurchaseStore
+        Store shared by all callbacks of this process.
+
+    """
+    store.refresh()
+    return store
@@ -0,0 +1,258 @@
+"""Date-indexed random access into the purchase file.
+
+barcodeRaspi appends purchases in chronological order, so ``purchase.txt``
+is sorted by date. :class:`DateIndex` keeps a sparse index with the byte
+offset and date of every ``stride``-th line. A query for a date window
+bisects the index and returns only the byte range containing the window,
+read through a memory map.
+
+The index is persisted next to the purchase file (``purchase.txt.idx``)
+and extended as the file grows. If the indexed lines changed, e.g. because
+the file was replaced, the index is rebuilt. Rewrites that keep the line
+structure, like marking debts as paid, do not invalidate it.
+"""
+import bisect
+import datetime
+import json
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+# bytes scanned for line breaks at once
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class DateIndex:
+    """Sparse line-offset/date index of a chronological purchase file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the purchase file.
+    stride : int
+        Number of lines between two index entries.
+    index_path : str, optional
+        Where to persist the index. Defaults to ``<path>.idx``. The index is
+        kept in memory only if the file can not be written.
+
+    """
+
+    def __init__(self, path, stride=256, index_path=None):
+        self.path = path
+        self.stride = stride
+        self.index_path = index_path or path + ".idx"
+        # byte offset and date of every stride-th line
+        self.offsets = []
+        self.dates = []
+        # number of indexed lines and byte offset after the last one
+        self.lines = 0
+        self.end = 0
+        self.sorted = True
+        self._signature = None
+        self._load()
+
+    def update(self):
+        """Index lines appended since the last update.
+
+        Returns
+        -------
+        changed : bool
+            True if new lines were indexed or the index was rebuilt.
+
+        """
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+
+            if stat.st_size == 0:
+                changed = self.lines > 0
+                self._reset()
+                return changed
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                rebuilt = not self._is_valid(mm)
+                if rebuilt:
+                    self._reset()
+                extended = self._extend(mm)
+
+        if rebuilt or extended:
+            self._save()
+        return rebuilt or extended
+
+    def window(self, start=None, end=None):
+        """Return the byte range containing all lines of a date window.
+
+        Parameters
+        ----------
+        start : datetime.datetime, optional
+            First date of the window (inclusive).
+        end : datetime.datetime, optional
+            Last date of the window (inclusive).
+
+        Returns
+        -------
+        lo : int
+            Offset of the first line that may be in the window.
+        hi : int
+            Offset after the last line that may be in the window.
+
+        """
+        if not self.sorted or not self.offsets:
+            return 0, self.end
+
+        lo, hi = 0, self.end
+        if start is not None:
+            # the entry before the first later one may start a line
+            # preceding lines of the window
+            i = bisect.bisect_left(self.dates, start)
+            lo = self.offsets[max(i - 1, 0)]
+        if end is not None:
+            j = bisect.bisect_right(self.dates, end)
+            if j < len(self.offsets):
+                hi = self.offsets[j]
+        return lo, max(lo, hi)
+
+    def read(self, start=None, end=None):
+        """Read the lines of a date window.
+
+        The returned lines may include a few lines just outside the window
+        (at most ``stride`` on either side), callers filter them exactly.
+
+        Parameters
+        ----------
+        start : datetime.datetime, optional
+            First date of the window (inclusive).
+        end : datetime.datetime, optional
+            Last date of the window (inclusive).
+
+        Returns
+        -------
+        content : bytes
+            Complete lines of the purchase file.
+
+        """
+        self.update()
+        lo, hi = self.window(start, end)
+        if hi <= lo:
+            return b""
+
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[lo:hi]
+
+    def _reset(self):
+        self.offsets = []
+        self.dates = []
+        self.lines = 0
+        self.end = 0
+        self.sorted = True
+
+    def _is_valid(self, mm):
+        """Check that the indexed lines are still in place."""
+        if self.end > len(mm):
+            return False
+        if self.end and mm[self.end - 1:self.end] != b"\n":
+            return False
+        for offset, date in zip(self.offsets, self.dates):
+            if offset and mm[offset - 1:offset] != b"\n":
+                return False
+            parsed = _line_date(mm, offset)
+            if parsed is not None and parsed != date:
+                return False
+        return True
+
+    def _extend(self, mm):
+        """Index the complete lines after ``self.end``."""
+        stop = mm.rfind(b"\n") + 1
+        if stop <= self.end:
+            return False
+
+        line = self.lines
+        start = self.end
+        for chunk_start in range(self.end, stop, CHUNK_SIZE):
+            chunk_stop = min(chunk_start + CHUNK_SIZE, stop)
+            chunk = np.frombuffer(mm[chunk_start:chunk_stop], dtype=np.uint8)
+            # starts of the lines ending in this chunk
+            breaks = np.flatnonzero(chunk == ord("\n")) + chunk_start + 1
+            if not len(breaks):
+                continue
+            starts = np.concatenate([[start], breaks[:-1]])
+
+            first = (-line) % self.stride
+            for offset in starts[first::self.stride]:
+                self._add_entry(int(offset), _line_date(mm, int(offset)))
+
+            line += len(starts)
+            start = int(breaks[-1])
+
+        self.lines = line
+        self.end = stop
+        return True
+
+    def _add_entry(self, offset, date):
+        if date is None or (self.dates and date < self.dates[-1]):
+            # not chronological, fall back to reading the whole file
+            self.sorted = False
+        if date is None:
+            date = self.dates[-1] if self.dates else datetime.datetime.min
+        self.offsets.append(offset)
+        self.dates.append(date)
+
+    def _load(self):
+        """Load a persisted index, start empty if there is none."""
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data["stride"] != self.stride:
+                return
+            self.offsets = data["offsets"]
+            self.dates = [datetime.datetime.fromisoformat(date)
+                          for date in data["dates"]]
+            self.lines = data["lines"]
+            self.end = data["end"]
+            self.sorted = data["sorted"]
+        except (OSError, ValueError, KeyError):
+            self._reset()
+
+    def _save(self):
+        """Persist the index next to the purchase file if possible."""
+        data = {
+            "stride": self.stride,
+            "offsets": self.offsets,
+            "dates": [date.isoformat(sep=" ") for date in self.dates],
+            "lines": self.lines,
+            "end": self.end,
+            "sorted": self.sorted,
+        }
+        directory, name = os.path.split(self.index_path)
+        try:
+            # a temporary file of its own, other workers may save at once
+            fd, tmp_path = tempfile.mkstemp(dir=directory or os.curdir,
+                                            prefix="." + name, suffix=".tmp")
+        except OSError:
+            # read-only data directory, keep the index in memory
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            # mkstemp creates files only readable by the owner
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            os.remove(tmp_path)
+
+
+def _line_date(mm, offset):
+    """Parse the date at the beginning of the line at ``offset``."""
+    head = mm[offset:offset + 40]
+    try:
+        return datetime.datetime.fromisoformat(
+            head.split(b",", 1)[0].decode()
+        )
+    except ValueError:
+        return None
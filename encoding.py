@@ -0,0 +1,192 @@
+"""Compact serialization of the dashboard figures.
+
+Plotly serializes every number of a trace as JSON text, so large traces
+cost several bytes per number and a float parse in the browser. With
+``COMPACT_FIGURES=1`` the figures are sent with
+
+- numeric arrays as base64 typed arrays ``{'dtype': 'u1', 'bdata': ...}``
+  (the binary array format of plotly.js >= 2.28, two dimensional arrays
+  additionally carry a ``shape``). Integers are stored in the smallest
+  type that holds them.
+- string arrays with repeated values dictionary encoded as
+  ``{'categories': [...], 'codes': <typed array>}``.
+- dates as ISO strings without the time if it is always midnight. Dates
+  are not sent as typed arrays, their milliseconds since the epoch are
+  larger than the strings once the response is compressed.
+
+The plotly.js bundled with dash predates the binary arrays, so
+``assets/figures.js`` decodes both formats before the figures are plotted.
+"""
+import base64
+import os
+
+import numpy as np
+import pandas as pd
+
+# typed array codes of plotly.js
+DTYPES = {
+    'i1': np.int8,
+    'u1': np.uint8,
+    'i2': np.int16,
+    'u2': np.uint16,
+    'i4': np.int32,
+    'u4': np.uint32,
+    'f4': np.float32,
+    'f8': np.float64,
+}
+
+# shorter arrays are cheaper as JSON
+MIN_LENGTH = 8
+
+
+def enabled():
+    """Check whether the compact figure serialization is enabled.
+
+    Returns
+    -------
+    enabled : bool
+        True if the ``COMPACT_FIGURES`` environment variable is set.
+
+    """
+    return os.getenv('COMPACT_FIGURES', '').lower() in ('1', 'true', 'yes')
+
+
+def compact(fig):
+    """Encode a figure compactly if enabled.
+
+    Parameters
+    ----------
+    fig : plotly.graph_objects.Figure
+        Figure as returned by ``plot_utils``.
+
+    Returns
+    -------
+    fig : plotly.graph_objects.Figure or dict
+        The figure itself if disabled, its encoded dict otherwise.
+
+    """
+    return encode_figure(fig) if enabled() else fig
+
+
+def encode_figure(fig):
+    """Encode the arrays of all traces of a figure.
+
+    Parameters
+    ----------
+    fig : plotly.graph_objects.Figure
+        Figure to encode.
+
+    Returns
+    -------
+    figure : dict
+        Figure with typed and dictionary encoded arrays.
+
+    """
+    figure = fig.to_plotly_json()
+    figure['data'] = [_encode_trace(trace) for trace in figure['data']]
+    return figure
+
+
+def decode_figure(figure):
+    """Decode an encoded figure into plain lists.
+
+    The inverse of :func:`encode_figure`, as done by ``assets/figures.js``
+    in the browser.
+
+    Parameters
+    ----------
+    figure : dict
+        Encoded figure.
+
+    Returns
+    -------
+    figure : dict
+        Figure with lists instead of encoded arrays.
+
+    """
+    return dict(figure, data=[_decode(trace) for trace in figure['data']])
+
+
+def _encode_trace(trace):
+    """Encode the arrays of a trace, nested attributes included."""
+    encoded = {}
+    for key, value in trace.items():
+        if isinstance(value, dict):
+            encoded[key] = _encode_trace(value)
+            continue
+        encoded[key] = value
+        if not isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+            continue
+
+        values = np.asarray(value)
+        if values.ndim not in (1, 2) or values.size < MIN_LENGTH:
+            continue
+        kind = pd.api.types.infer_dtype(values.ravel(), skipna=False)
+        if kind in ('integer', 'floating', 'mixed-integer-float'):
+            encoded[key] = _encode_numbers(values.astype(float))
+        elif kind in ('datetime64', 'datetime', 'date') \
+                and values.ndim == 1 and not pd.isna(values).any():
+            encoded[key] = _encode_dates(values)
+        elif kind == 'string' and values.ndim == 1:
+            encoded[key] = _encode_labels(values)
+    return encoded
+
+
+def _encode_numbers(values):
+    """Encode numbers in the smallest typed array that holds them."""
+    dtype = 'f8'
+    finite = np.isfinite(values).all()
+    if finite and (values == np.round(values)).all():
+        low, high = values.min(), values.max()
+        for code in ('u1', 'i1', 'u2', 'i2', 'u4', 'i4'):
+            info = np.iinfo(DTYPES[code])
+            if info.min <= low and high <= info.max:
+                dtype = code
+                break
+    return _typed_array(values, dtype)
+
+
+def _encode_dates(values):
+    """Encode dates as short ISO strings."""
+    dates = pd.DatetimeIndex(pd.to_datetime(values))
+    if (dates == dates.normalize()).all():
+        return dates.strftime('%Y-%m-%d').tolist()
+    return dates.strftime('%Y-%m-%d %H:%M:%S').tolist()
+
+
+def _encode_labels(values):
+    """Dictionary encode strings if they repeat."""
+    codes, categories = pd.factorize(values)
+    if 2 * len(categories) > len(values):
+        return values.tolist()
+    return {
+        'categories': categories.tolist(),
+        'codes': _encode_numbers(codes.astype(float)),
+    }
+
+
+def _typed_array(values, dtype):
+    """Build a plotly.js typed array specification."""
+    data = np.ascontiguousarray(values, dtype=np.dtype(DTYPES[dtype])
+                                .newbyteorder('<'))
+    array = {'dtype': dtype, 'bdata': base64.b64encode(data).decode()}
+    if data.ndim > 1:
+        array['shape'] = ','.join(str(n) for n in data.shape)
+    return array
+
+
+def _decode(value):
+    """Decode typed and dictionary encoded arrays of a trace."""
+    if not isinstance(value, dict):
+        return value
+    if 'bdata' in value:
+        data = np.frombuffer(base64.b64decode(value['bdata']),
+                             dtype=np.dtype(DTYPES[value['dtype']])
+                             .newbyteorder('<'))
+        if 'shape' in value:
+            data = data.reshape([int(n) for n in value['shape'].split(',')])
+        return data.tolist()
+    if 'categories' in value:
+        categories = value['categories']
+        return [categories[code] for code in _decode(value['codes'])]
+    return {key: _decode(item) for key, item in value.items()}
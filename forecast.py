@@ -0,0 +1,128 @@
+"""Forecast when the products run out of stock.
+
+The consumption of each product is estimated as an exponentially weighted
+moving average of its daily purchases. With the decay ``a`` the rate on
+day ``T`` is
+
+    rate(T) = (1 - a) * sum(a ** (T - d) * count(d))
+
+over all days ``d``. Each purchase contributes ``(1 - a) * a ** (T - d)``,
+so new purchases are added with a single weighted bincount and advancing
+``T`` multiplies all rates by ``a ** dT``. The rates are thus maintained
+incrementally as purchases arrive instead of being recomputed from the
+whole history.
+"""
+import numpy as np
+import pandas as pd
+
+# span of the moving average in days
+SPAN = 14
+
+# products running out within this many days need to be reordered
+REORDER_DAYS = 7
+
+
+class ConsumptionRates:
+    """Exponentially weighted purchases per day of each product.
+
+    Parameters
+    ----------
+    span : float, optional
+        Span of the moving average in days, the decay per day is
+        ``1 - 2 / (span + 1)``.
+
+    """
+
+    def __init__(self, span=SPAN):
+        self.decay = 1 - 2 / (span + 1)
+        self.reset()
+
+    def reset(self):
+        """Forget all purchases."""
+        # reference day of the rates (days since the epoch)
+        self.day = None
+        self.rates = pd.Series(dtype=float)
+
+    def add(self, purchases):
+        """Add purchases to the rates.
+
+        Parameters
+        ----------
+        purchases : pandas.DataFrame
+            Purchases with ``date`` and ``barcode``, in any order.
+
+        """
+        purchases = purchases.dropna(subset=['date', 'barcode'])
+        if not len(purchases):
+            return
+
+        days = purchases['date'].to_numpy(dtype='datetime64[D]') \
+            .astype('int64')
+        day = int(days.max())
+        if self.day is not None:
+            day = max(day, self.day)
+            self.rates = self.rates * self.decay ** (day - self.day)
+        self.day = day
+
+        codes, barcodes = pd.factorize(purchases['barcode'])
+        weights = (1 - self.decay) * self.decay ** (day - days)
+        self.rates = self.rates.add(
+            pd.Series(np.bincount(codes, weights=weights), index=barcodes),
+            fill_value=0
+        )
+
+    def at(self, date):
+        """Return the rates on a given day.
+
+        Parameters
+        ----------
+        date : pandas.Timestamp
+            Day of the rates, not before the last purchase.
+
+        Returns
+        -------
+        rates : pandas.Series
+            Purchases per day, indexed by barcode.
+
+        """
+        if self.day is None:
+            return self.rates
+        day = pd.Timestamp(date).to_datetime64().astype('datetime64[D]') \
+            .astype('int64')
+        return self.rates * self.decay ** max(day - self.day, 0)
+
+
+def forecast(products, rates, date):
+    """Estimate the days until each product runs out of stock.
+
+    Parameters
+    ----------
+    products : pandas.DataFrame
+        Product data with ``product``, ``barcode`` and ``stock``.
+    rates : ConsumptionRates
+        Consumption of the products.
+    date : pandas.Timestamp
+        Day of the forecast.
+
+    Returns
+    -------
+    forecast : pandas.DataFrame
+        ``product``, ``barcode``, ``stock``, ``rate`` (purchases per day),
+        ``days_left`` (NaN for products not purchased recently) and
+        ``reorder`` (runs out within :data:`REORDER_DAYS`).
+
+    """
+    rate = products['barcode'].map(rates.at(date)).fillna(0).to_numpy()
+    stock = np.maximum(products['stock'].to_numpy(dtype=float), 0)
+
+    # round off the tails of products no longer purchased
+    active = rate > 1e-3
+    days_left = np.full(len(products), np.nan)
+    days_left[active] = stock[active] / rate[active]
+    days_left[stock == 0] = 0
+
+    return products[['product', 'barcode', 'stock']].assign(
+        rate=rate,
+        days_left=days_left,
+        reorder=days_left < REORDER_DAYS,
+    )
@@ -0,0 +1,264 @@
+"""Parsing of the barcodeRaspi data files with a fixed schema.
+
+Both files have no header and always the same columns, so their types
+need not be inferred. The parser is chosen with ``CSV_ENGINE``:
+
+- ``pandas`` (default): the C parser of pandas,
+- ``arrow``: the multithreaded CSV reader of pyarrow (optional dependency).
+  Falls back to pandas with a warning if pyarrow is not installed.
+
+Both convert the fields directly into the typed columns of the schema.
+
+A malformed line (wrong number of fields, a date or number that does not
+parse) makes the parsers fail. With ``CSV_QUARANTINE=1`` the content is
+validated column by column instead and malformed lines are moved to a side
+file (``purchase-quarantine.txt`` next to ``purchase.txt``) while the
+valid lines are used. The validation splits the lines at commas, fields of
+the data files are never quoted. Empty fields are missing values, not
+malformed.
+"""
+import io
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+PURCHASE_SCHEMA = {
+    'date': 'datetime',
+    'name': 'string',
+    'barcode': 'int',
+    'paid': 'int',
+}
+PRODUCT_SCHEMA = {
+    'id': 'int',
+    'barcode': 'int',
+    'product': 'string',
+    'price': 'float',
+    'stock': 'int',
+}
+
+QUARANTINE_SUFFIX = '-quarantine'
+
+# lines already in each quarantine file
+_quarantined = {}
+
+
+def engine():
+    """Return the configured CSV engine.
+
+    Returns
+    -------
+    engine : str
+        ``arrow`` if ``CSV_ENGINE`` selects it and pyarrow is installed,
+        ``pandas`` otherwise.
+
+    """
+    if os.getenv('CSV_ENGINE', 'pandas').lower() != 'arrow':
+        return 'pandas'
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        warnings.warn('pyarrow is not installed, parsing with pandas')
+        return 'pandas'
+    return 'arrow'
+
+
+def tolerant():
+    """Check whether malformed lines are quarantined.
+
+    Returns
+    -------
+    tolerant : bool
+        True if the ``CSV_QUARANTINE`` environment variable is set.
+
+    """
+    return os.getenv('CSV_QUARANTINE', '').lower() in ('1', 'true', 'yes')
+
+
+def parse(content, schema, engine='pandas', tolerant=False):
+    """Parse the content of a data file.
+
+    Parameters
+    ----------
+    content : bytes
+        Complete lines of the file.
+    schema : dict
+        Maps each column to its kind (``datetime``, ``string``, ``int`` or
+        ``float``).
+    engine : str, optional
+        ``pandas`` or ``arrow``, see :func:`engine`.
+    tolerant : bool, optional
+        Skip malformed lines instead of failing.
+
+    Returns
+    -------
+    frame : pandas.DataFrame
+        Parsed lines. Integer columns are floats if values are missing.
+    rejected : list of str
+        Malformed lines, only in tolerant mode.
+
+    Raises
+    ------
+    ValueError
+        If a line is malformed and ``tolerant`` is not set.
+
+    """
+    try:
+        if engine == 'arrow':
+            frame = _read_arrow(content, schema)
+        else:
+            frame = _read_pandas(content, schema)
+        return frame, []
+    except ValueError:
+        if not tolerant:
+            raise
+    return _validate(content, schema)
+
+
+def quarantine_path(path):
+    """Return the side file of the malformed lines of a data file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the data file.
+
+    Returns
+    -------
+    path : str
+        ``<file>-quarantine.txt`` for ``<file>.txt``.
+
+    """
+    base, extension = os.path.splitext(path)
+    return base + QUARANTINE_SUFFIX + extension
+
+
+def quarantine(path, lines):
+    """Append malformed lines to the side file of a data file.
+
+    Lines already in the side file are skipped, so reparsing a file does
+    not quarantine its lines again.
+
+    Parameters
+    ----------
+    path : str
+        Path to the data file.
+    lines : list of str
+        Malformed lines of the file.
+
+    """
+    if not lines:
+        return
+    target = quarantine_path(path)
+    if target not in _quarantined:
+        try:
+            with open(target) as f:
+                _quarantined[target] = set(f.read().splitlines())
+        except OSError:
+            _quarantined[target] = set()
+
+    known = _quarantined[target]
+    new = [line for line in dict.fromkeys(lines) if line not in known]
+    if not new:
+        return
+    known.update(new)
+    try:
+        with open(target, 'a') as f:
+            f.write(''.join(line + '\n' for line in new))
+    except OSError:
+        # read-only data directory, the lines are skipped nevertheless
+        pass
+
+
+def _read_pandas(content, schema):
+    """Parse with the C parser of pandas, as strict as pyarrow.
+
+    Integers are read as floats, which allows missing values, and checked
+    to have no fraction. Dates pandas can not parse stay strings and are
+    rejected.
+
+    """
+    types = {'string': str, 'int': 'float64', 'float': 'float64'}
+    frame = pd.read_csv(
+        io.BytesIO(content), header=None, names=list(schema),
+        dtype={column: types[kind] for column, kind in schema.items()
+               if kind in types},
+        parse_dates=[column for column, kind in schema.items()
+                     if kind == 'datetime'],
+    )
+
+    # pandas fills up missing fields and turns surplus ones into the index,
+    # blank lines are skipped and every other line has the same commas
+    if content.count(b',') != len(frame) * (len(schema) - 1):
+        raise ValueError('wrong number of fields')
+    for column, kind in schema.items():
+        values = frame[column]
+        if kind == 'datetime' \
+                and not pd.api.types.is_datetime64_dtype(values):
+            raise ValueError('{} is not a date'.format(column))
+        if kind == 'int':
+            if (values.notna() & (values != np.round(values))).any():
+                raise ValueError('{} is not an integer'.format(column))
+            if not values.isna().any():
+                frame[column] = values.astype('int64')
+    return frame
+
+
+def _read_arrow(content, schema):
+    """Parse with the multithreaded CSV reader of pyarrow."""
+    import pyarrow as pa
+    from pyarrow import csv
+
+    types = {
+        'datetime': pa.timestamp('ns'),
+        'string': pa.string(),
+        'int': pa.int64(),
+        'float': pa.float64(),
+    }
+    table = csv.read_csv(
+        io.BytesIO(content),
+        read_options=csv.ReadOptions(column_names=list(schema),
+                                     use_threads=True),
+        convert_options=csv.ConvertOptions(
+            column_types={column: types[kind]
+                          for column, kind in schema.items()},
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
+
+
+def _validate(content, schema):
+    """Convert the content column by column and reject malformed lines."""
+    text = pd.Series(content.decode('utf-8', errors='replace').split('\n'))
+    text = text.str.rstrip('\r')
+    text = text[text.str.strip() != ''].reset_index(drop=True)
+
+    fields = text.str.split(',', expand=True)
+    rejected = (text.str.count(',') != len(schema) - 1).to_numpy()
+
+    frame = pd.DataFrame(index=text.index)
+    for position, (column, kind) in enumerate(schema.items()):
+        values = (fields[position] if position in fields
+                  else pd.Series('', index=text.index))
+        missing = values.isna() | (values.str.strip() == '')
+        values = values.where(~missing)
+
+        if kind == 'datetime':
+            converted = pd.to_datetime(values, errors='coerce')
+        elif kind in ('int', 'float'):
+            converted = pd.to_numeric(values, errors='coerce')
+            if kind == 'int':
+                fraction = converted != np.round(converted)
+                rejected |= (fraction & converted.notna()).to_numpy()
+        else:
+            converted = values
+        rejected |= (converted.isna() & ~missing).to_numpy()
+        frame[column] = converted
+
+    frame = frame[~rejected].reset_index(drop=True)
+    for column, kind in schema.items():
+        if kind == 'int' and not frame[column].isna().any():
+            frame[column] = frame[column].astype('int64')
+    return frame, text[rejected].tolist()
@@ -8,8 +8,8 @@ from dash.dash_table.Format import Format
 def serve_layout():
     """Build the top-level dashboard layout.
 
-    Contains two hidden divs with the number of the currently selected
-    state and the colormap sharedSacross callbacks.
+    Contains a hidden div with the fingerprint of the data shared across
+    callbacks.
 
     Returns
     -------
@@ -26,7 +26,8 @@ def serve_layout():
                 interval=15 * 60 * 1000,  # in milliseconds
                 n_intervals=0
             ),
-            # hidden div for shared data
+            # hidden div with the fingerprint of the data, triggers the
+            # callbacks with every update
             html.Div(
                 id='shared_data',
                 children=[],
@@ -66,26 +67,69 @@ def serve_layout():
                     ]
                 )
             ),
-            # content
+            # content below the fold, only rendered once it is scrolled
+            # into view (see assets/lazy.js) and its tab is opened
             html.P(
-                dbc.Row(
-                    children=[
-                        dbc.Col(
-                            build_inventory_overview(),
-                            width=6
-                        ),
-                        dbc.Col(
-                            build_chart(),
-                            width=6
-                        ),
-                    ]
-                )
+                build_detail_tabs()
             ),
         ],
     )
     return layout
 
 
+def build_detail_tabs():
+    """Build the tabs with the content below the fold.
+
+    The figures of a tab are only computed once the tabs have been
+    scrolled into view and the tab is active. ``assets/lazy.js`` clicks the
+    hidden ``details_visible`` button when the tabs become visible.
+
+    Returns
+    -------
+    tabs : dash_html_components.Div
+        Div with the tabs and the hidden visibility trigger.
+
+    """
+    tabs = html.Div(
+        id='details',
+        children=[
+            html.Button(
+                id='details_visible',
+                n_clicks=0,
+                style={'display': 'none'}
+            ),
+            dbc.Tabs(
+                id='detail_tabs',
+                active_tab='tab-overview',
+                children=[
+                    dbc.Tab(
+                        dbc.Row(
+                            children=[
+                                dbc.Col(
+                                    build_inventory_overview(),
+                                    width=6
+                                ),
+                                dbc.Col(
+                                    build_chart(),
+                                    width=6
+                                ),
+                            ]
+                        ),
+                        label='Inventar & Statistik',
+                        tab_id='tab-overview',
+                    ),
+                    dbc.Tab(
+                        build_person_overview(),
+                        label='Persönliche Übersicht',
+                        tab_id='tab-person',
+                    ),
+                ]
+            ),
+        ]
+    )
+    return tabs
+
+
 def build_info_cards():
     """Build the top row of the layout with info cards.
 
@@ -224,6 +268,7 @@ def build_timeline():
             {'label': 'Monat', 'value': 'month'},
             {'label': 'Wochentag', 'value': 'weekday'},
             {'label': 'Uhrzeit', 'value': 'hour'},
+            {'label': 'Woche', 'value': 'heatmap'},
         ],
         value='no_filter',
         inline=True,
@@ -265,7 +310,32 @@ def build_timeline():
 
 
 def build_debt_table():
-    """Build a table with current debts."""
+    """Build a table with current debts.
+
+    Paging, sorting and filtering are done by the server. Selecting a row
+    shows the unpaid purchases of that person below the table.
+
+    """
+    style_header = {
+        'backgroundColor': '#d1d1d1ff',
+        'fontWeight': 'bold',
+        'fontSize': '130%',
+        'textAlign': 'center',
+    }
+    style_cell = {
+        'padding': '5px',
+        'textAlign': 'center',
+        'fontSize': '120%',
+        'fontFamily': 'Helvetica',
+        'height': '120%'
+    }
+    style_data_conditional = [
+        {
+            'if': {'row_index': 'odd'},
+            'backgroundColor': '#f5f5f5ff'
+        }
+    ]
+
     card = dbc.Card(
         children=[
             dbc.CardHeader(
@@ -274,50 +344,79 @@ def build_debt_table():
                 ]
             ),
             dbc.CardBody(
-                dash_table.DataTable(
-                    id='debt_table',
-                    columns=[
-                        {
-                            'id': 'name',
-                            'name': 'Name',
-                            'type': 'text'
-                        }, {
-                            'id': 'price',
-                            'name': 'Schulden [EUR]',
-                            'type': 'numeric',
-                            'format': Format(
-                                scheme='f',
-                                precision=2
-                            ),
-                        }
-                    ],
-                    data=[],
-                    style_table={
-                        'height': '450px',
-                    },
-                    style_header={
-                        'backgroundColor': '#d1d1d1ff',
-                        'fontWeight': 'bold',
-                        'fontSize': '130%',
-                        'textAlign': 'center',
-                    },
-                    style_cell={
-                        'padding': '5px',
-                        'textAlign': 'center',
-                        'fontSize': '120%',
-                        'fontFamily': 'Helvetica',
-                        'height': '120%'
-                    },
-                    style_data_conditional=[
-                        {
-                            'if': {'row_index': 'odd'},
-                            'backgroundColor': '#f5f5f5ff'
-                        }
-                    ],
-                    style_as_list_view=True,
-                    filter_action="none",
-                    sort_action="native",
-                )
+                children=[
+                    dash_table.DataTable(
+                        id='debt_table',
+                        columns=[
+                            {
+                                'id': 'name',
+                                'name': 'Name',
+                                'type': 'text'
+                            }, {
+                                'id': 'price',
+                                'name': 'Schulden [EUR]',
+                                'type': 'numeric',
+                                'format': Format(
+                                    scheme='f',
+                                    precision=2
+                                ),
+                            }, {
+                                'id': 'items',
+                                'name': 'Käufe',
+                                'type': 'numeric',
+                            }
+                        ],
+                        data=[],
+                        style_header=style_header,
+                        style_cell=style_cell,
+                        style_data_conditional=style_data_conditional,
+                        style_as_list_view=True,
+                        page_action="custom",
+                        page_current=0,
+                        page_size=10,
+                        filter_action="custom",
+                        filter_query="",
+                        sort_action="custom",
+                        sort_mode="single",
+                        sort_by=[],
+                    ),
+                    html.H4(
+                        id='debt_details_title',
+                        children="",
+                        style={'margin-top': '1rem'}
+                    ),
+                    dash_table.DataTable(
+                        id='debt_details',
+                        columns=[
+                            {
+                                'id': 'date',
+                                'name': 'Datum',
+                                'type': 'text'
+                            }, {
+                                'id': 'product',
+                                'name': 'Produkt',
+                                'type': 'text'
+                            }, {
+                                'id': 'price',
+                                'name': 'EUR',
+                                'type': 'numeric',
+                                'format': Format(
+                                    scheme='f',
+                                    precision=2
+                                ),
+                            }
+                        ],
+                        data=[],
+                        style_table={
+                            'maxHeight': '300px',
+                            'overflowY': 'auto',
+                        },
+                        style_header=style_header,
+                        style_cell=style_cell,
+                        style_data_conditional=style_data_conditional,
+                        style_as_list_view=True,
+                    ),
+                ]
             )
         ]
     )
@@ -337,6 +436,13 @@ def build_inventory_overview():
                         id="inventory",
                         figure={},
                     ),
+                    dbc.Pagination(
+                        id="inventory_page",
+                        max_value=1,
+                        active_page=1,
+                        fully_expanded=False,
+                        style={'display': 'none'},
+                    ),
                 ]
             )
         ]
@@ -389,9 +495,65 @@ def build_chart():
                     dcc.Graph(
                         id="statistics",
                         figure={},
-                    )
+                    ),
+                    dbc.Pagination(
+                        id="statistics_page",
+                        max_value=1,
+                        active_page=1,
+                        fully_expanded=False,
+                        style={'display': 'none'},
+                    ),
                 ]
             )
         ]
     )
     return card
+
+
+def build_person_overview():
+    """Build a detail view of the purchases of a single person."""
+    card = dbc.Card(
+        children=[
+            dbc.CardHeader(
+                dbc.Row(
+                    children=[
+                        dbc.Col(
+                            html.H2("Persönliche Übersicht"),
+                            width=8
+                        ),
+                        dbc.Col(
+                            dcc.Dropdown(
+                                id="person_select",
+                                options=[],
+                                value=None,
+                                placeholder="Person auswählen",
+                            ),
+                            width=4,
+                            style={'margin-top': '5px'}
+                        ),
+                    ]
+                )
+            ),
+            dbc.CardBody(
+                dbc.Row(
+                    children=[
+                        dbc.Col(
+                            dcc.Graph(
+                                id="person_history",
+                                figure={},
+                            ),
+                            width=8
+                        ),
+                        dbc.Col(
+                            dcc.Graph(
+                                id="person_products",
+                                figure={},
+                            ),
+                            width=4
+                        ),
+                    ]
+                )
+            )
+        ]
+    )
+    return card
@@ -7,25 +7,38 @@ def plot_inventory_chart(remaining):
 
     Parameters
     ----------
-    remaining : pandas.Series
-        Series object containing the number of remaining items
+    remaining : pandas.DataFrame
+        Data frame containing the number of remaining items (``stock``),
+        the ``price``, the forecast ``days_left`` and the ``reorder`` flag
         for each product category.
 
     Returns
     -------
     fig : plotly.graph_objects.Figure
-        Bar chart showing the number of remaining items.
+        Bar chart showing the number of remaining items, products to
+        reorder in red.
 
     """
     # calculate height of plot
     height = len(remaining) * 30
 
+    days_left = [
+        '' if days != days else 'noch ~{:.0f} Tage'.format(days)
+        for days in remaining['days_left']
+    ]
+    colors = ['#802020' if reorder else '#636efa'
+              for reorder in remaining['reorder'].fillna(False)]
+
     data = go.Bar(
         x=remaining['stock'].values,
         y=remaining.index,
         customdata=remaining['price'],
+        text=days_left,
+        textposition='auto',
+        marker_color=colors,
         orientation='h',
-        hovertemplate='<b>%{y}</b><br>%{x} Stück<br>%{customdata:.2f} EUR<extra></extra>',
+        hovertemplate=('<b>%{y}</b><br>%{x} Stück<br>'
+                       '%{customdata:.2f} EUR<br>%{text}<extra></extra>'),
     ),
 
     layout = go.Layout(
@@ -182,6 +195,61 @@ def plot_purch_per_time(purch, x_type):
     return fig
 
 
+def plot_hour_weekday(purch):
+    """Plot a heatmap of the purchases per hour and weekday.
+
+    Parameters
+    ----------
+    purch : pandas.DataFrame
+      Number of purchases, indexed by weekday with a column per hour.
+
+    Returns
+    -------
+    fig : plotly.graph_objects.Figure
+      Heatmap showing the number of purchases per hour and weekday.
+
+    """
+    data = go.Heatmap(
+        x=purch.columns,
+        y=purch.index,
+        z=purch.values,
+        customdata=[[hour + 1 for hour in purch.columns]] * len(purch),
+        colorscale='Blues',
+        hovertemplate=(
+            '<b>%{y}, %{x}-%{customdata} Uhr</b><br>'
+            + '%{z} Käufe<extra></extra>'
+        ),
+    )
+
+    layout = go.Layout(
+        xaxis=dict(title='Uhrzeit',
+                   titlefont=dict(size=20),
+                   tickfont=dict(size=15),
+                   dtick=1,
+                   mirror=True,
+                   ticks='outside',
+                   showline=False,
+                   linewidth=1,
+                   ),
+        yaxis=dict(title='',
+                   tickfont=dict(size=15),
+                   autorange='reversed',
+                   mirror=False,
+                   showline=True,
+                   linewidth=1,
+                   ),
+        margin={'t': 0, 'b': 0, 'l': 0, 'r': 0},
+        hoverlabel=dict(font=dict(size=20), namelength=-1),
+    )
+
+    fig = go.Figure(
+        data=data,
+        layout=layout
+    )
+
+    return fig
+
+
 def plot_rel_drinks_per_person(rel_drinks_per_person):
     """Plot a bar chart to visualize who drinks what.
 
@@ -299,3 +367,116 @@ def plot_abs_drinks_per_person(abs_drinks_per_person):
     )
 
     return fig
+
+
+def plot_person_history(history):
+    """Plot the paid and unpaid purchases of a person per month.
+
+    Parameters
+    ----------
+    history : pandas.DataFrame
+        Data frame indexed by month with the columns ``paid`` and
+        ``unpaid`` containing the number of purchases.
+
+    Returns
+    -------
+    fig : plotly.graph_objects.Figure
+      Stacked bar plot showing the number of purchases per month.
+
+    """
+    data = [
+        go.Bar(
+            x=history.index,
+            y=history['paid'].values,
+            name='bezahlt',
+            marker_color='#216b27',
+            hovertemplate='<b>%{x|%m/%Y}</b><br>%{y} bezahlt<extra></extra>',
+        ),
+        go.Bar(
+            x=history.index,
+            y=history['unpaid'].values,
+            name='offen',
+            marker_color='#802020',
+            hovertemplate='<b>%{x|%m/%Y}</b><br>%{y} offen<extra></extra>',
+        ),
+    ]
+
+    layout = go.Layout(
+        xaxis=dict(title='Monat',
+                   titlefont=dict(size=20),
+                   tickfont=dict(size=15),
+                   mirror=True,
+                   ticks='outside',
+                   showline=False,
+                   linewidth=1,
+                   ),
+        yaxis=dict(title='Käufe',
+                   titlefont=dict(size=20),
+                   tickfont=dict(size=15),
+                   mirror=False,
+                   showline=True,
+                   linewidth=1,
+                   ),
+        margin={'t': 0, 'b': 0, 'l': 50, 'r': 0},
+        showlegend=True,
+        legend=dict(font=dict(size=15)),
+        hoverlabel=dict(font=dict(size=20)),
+        barmode='stack'
+    )
+
+    fig = go.Figure(
+        data=data,
+        layout=layout
+    )
+
+    return fig
+
+
+def plot_product_mix(products):
+    """Plot a bar chart of the products purchased by a person.
+
+    Parameters
+    ----------
+    products : pandas.Series
+        Series object containing the number of purchases per product.
+
+    Returns
+    -------
+    fig : plotly.graph_objects.Figure
+      Bar plot showing the number of purchases per product.
+
+    """
+    data = go.Bar(
+        x=products.values,
+        y=products.index,
+        orientation='h',
+        hovertemplate='<b>%{y}</b><br>%{x} Stück<extra></extra>',
+    )
+
+    layout = go.Layout(
+        xaxis=dict(title='Anzahl',
+                   titlefont=dict(size=20),
+                   tickfont=dict(size=15),
+                   mirror=True,
+                   ticks='outside',
+                   showline=False,
+                   linewidth=1,
+                   ),
+        yaxis=dict(title='',
+                   titlefont=dict(size=20),
+                   tickfont=dict(size=15),
+                   mirror=False,
+                   showline=True,
+                   linewidth=1,
+                   ),
+        margin={'t': 0, 'b': 0, 'l': 0, 'r': 0},
+        showlegend=False,
+        hoverlabel=dict(font=dict(size=20), namelength=-1),
+    )
+
+    fig = go.Figure(
+        data=data,
+        layout=layout
+    )
+
+    return fig
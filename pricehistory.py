@@ -0,0 +1,237 @@
+"""History of the product prices.
+
+``produkt.txt`` only contains the current prices. :class:`PriceHistory`
+snapshots the prices whenever the product file changes and keeps a table
+of ``date,barcode,price`` rows, each price valid from its date on. Every
+purchase can then be valued at the price valid at the time of the purchase
+instead of today's price.
+
+The history is persisted next to the product file (``produkt-prices.txt``)
+and only ever appended to. Every worker process of the server sees the
+change of the product file, so the history is reloaded under an exclusive
+file lock before appending and a price is only appended if it differs from
+the latest persisted one. Purchases made before the first snapshot of a
+product are valued at its first known price.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = ['date', 'barcode', 'price']
+
+
+class PriceHistory:
+    """Prices of all products over time.
+
+    Parameters
+    ----------
+    path : str
+        Path to the persisted history. The history is kept in memory only
+        if the file can not be written.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.history = pd.DataFrame({
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'barcode': pd.Series(dtype='int64'),
+            'price': pd.Series(dtype=float),
+        })
+        self._load()
+
+    def update(self, products, date):
+        """Snapshot the prices that changed since the last snapshot.
+
+        Parameters
+        ----------
+        products : pandas.DataFrame
+            Product data with ``barcode`` and ``price``.
+        date : pandas.Timestamp
+            Time of the change, the new prices are valid from then on.
+
+        Returns
+        -------
+        changed : bool
+            True if a price changed or a product was added, either by this
+            update or by another process since the last one.
+
+        """
+        try:
+            f = open(self.path, 'a+')
+        except OSError:
+            # read-only data directory, keep the history in memory
+            return self._append(products, date) is not None
+
+        with f:
+            _lock(f, exclusive=True)
+            f.seek(0)
+            reloaded = self._read(f)
+            new = self._append(products, date)
+            if new is not None:
+                f.write(_to_csv(new))
+        return reloaded or new is not None
+
+    def _append(self, products, date):
+        """Add the prices that differ from the latest ones to the history.
+
+        Returns
+        -------
+        new : pandas.DataFrame or None
+            Added rows, None if no price changed.
+
+        """
+        current = products.drop_duplicates('barcode').set_index('barcode')
+        current = current['price'].astype(float)
+        latest = self.history.groupby('barcode')['price'].last()
+
+        previous = latest.reindex(current.index).to_numpy()
+        changed = ~(current.to_numpy() == previous)
+        # a missing price stays missing, but a new product is a change
+        changed &= ~(np.isnan(previous) & np.isnan(current.to_numpy())
+                     & current.index.isin(latest.index))
+        if not changed.any():
+            return None
+
+        # keep the history sorted even if the clock went backwards
+        if len(self.history):
+            date = max(pd.Timestamp(date), self.history['date'].max())
+        new = pd.DataFrame({
+            'date': pd.Timestamp(date),
+            'barcode': current.index[changed].astype('int64'),
+            'price': current[changed].to_numpy(),
+        })
+        self.history = pd.concat([self.history, new], ignore_index=True)
+        self._index()
+        return new
+
+    def lookup(self, barcodes, dates):
+        """Look up the price valid at each purchase.
+
+        An as-of join over the history sorted by barcode and date: each
+        purchase is located in the sorted keys by binary search, so the
+        costs are O(n log m) for n purchases and m history entries.
+
+        Parameters
+        ----------
+        barcodes : array_like
+            Barcode of each purchase.
+        dates : array_like
+            Date of each purchase.
+
+        Returns
+        -------
+        prices : numpy.ndarray
+            Price of each purchase, NaN for unknown barcodes.
+
+        """
+        # barcodes are parsed as floats if some are missing
+        barcodes = np.asarray(barcodes, dtype=float)
+        prices = np.full(len(barcodes), np.nan)
+        if not len(self._barcodes) or not len(barcodes):
+            return prices
+
+        valid = ~np.isnan(barcodes)
+        barcodes = np.where(valid, barcodes, -1).astype('int64')
+        codes = np.searchsorted(self._barcodes, barcodes)
+        codes = np.minimum(codes, len(self._barcodes) - 1)
+        known = valid & (self._barcodes[codes] == barcodes)
+
+        keys = _keys(codes, pd.to_datetime(dates))
+        positions = np.searchsorted(self._keys, keys, side='right') - 1
+        # purchases before the first snapshot of their product
+        early = (positions < 0) | (self._codes[np.maximum(positions, 0)]
+                                   != codes)
+        positions[early] = self._first[codes[early]]
+
+        prices[known] = self._prices[positions[known]]
+        return prices
+
+    def _index(self):
+        """Sort the history by barcode and date into lookup arrays."""
+        history = self.history.sort_values(['barcode', 'date'],
+                                           kind='stable')
+        barcodes = history['barcode'].to_numpy(dtype='int64')
+        self._barcodes, self._first, codes = np.unique(
+            barcodes, return_index=True, return_inverse=True
+        )
+        self._codes = codes
+        self._keys = _keys(codes, history['date'])
+        self._prices = history['price'].to_numpy(dtype=float)
+
+    def _load(self):
+        """Load the persisted history, start empty if there is none."""
+        try:
+            with open(self.path) as f:
+                _lock(f, exclusive=False)
+                self._read(f)
+        except OSError:
+            pass
+        self._index()
+
+    def _read(self, f):
+        """Replace the history by the persisted one if it has more rows.
+
+        Returns
+        -------
+        reloaded : bool
+            True if the history was replaced.
+
+        """
+        try:
+            history = pd.read_csv(f, header=None, names=HISTORY_COLUMNS)
+            history['date'] = pd.to_datetime(history['date'])
+            history['barcode'] = history['barcode'].astype('int64')
+        except (ValueError, pd.errors.EmptyDataError):
+            return False
+        if len(history) <= len(self.history):
+            return False
+        self.history = history
+        self._index()
+        return True
+
+
+def default_path(product_file):
+    """Return the path of the price history of a product file.
+
+    Parameters
+    ----------
+    product_file : str
+        Path to ``produkt.txt``.
+
+    Returns
+    -------
+    path : str
+        ``PRICE_HISTORY_FILE`` if set, ``<product>-prices.txt`` otherwise.
+
+    """
+    return (os.getenv('PRICE_HISTORY_FILE')
+            or os.path.splitext(product_file)[0] + '-prices.txt')
+
+
+def _lock(f, exclusive):
+    """Lock an open file until it is closed."""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def _to_csv(history):
+    """Format rows of the history as lines of the persisted file."""
+    return history.assign(
+        date=history['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    ).to_csv(header=False, index=False)
+
+
+def _keys(codes, dates):
+    """Combine barcode codes and dates into sortable int64 keys."""
+    seconds = np.asarray(dates, dtype='datetime64[s]').astype('int64')
+    return (np.asarray(codes, dtype='int64') << 32) + np.clip(
+        seconds, 0, 2 ** 32 - 1
+    )
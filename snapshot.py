@@ -0,0 +1,406 @@
+"""Static snapshot of the dashboard for kiosk displays.
+
+A wall monitor shows the same view all day and triggers every callback for
+it. Setting ``SNAPSHOT_DIR`` exports the complete state of the dashboard
+(info cards, debt table and all figures as JSON) into a static bundle in
+that directory instead:
+
+- ``index.html``, a page rendering the bundle with plotly.js,
+- ``plotly.min.js`` and ``figures.js`` (decodes compact figures),
+- ``data.json`` with the state of the dashboard.
+
+The state is rendered by resolving the callbacks of the dashboard once, in
+the same order as the browser does, and only again when the data version
+of the store changes (checked every ``SNAPSHOT_INTERVAL`` seconds, default
+60). The page reloads ``data.json`` periodically, so the directory can be
+served by any static web server without executing a single callback per
+viewer.
+"""
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+
+from . import callgraph
+from .startup import lazy_import
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows
+    fcntl = None
+
+# imported on first use to keep the startup fast
+datastore = lazy_import('.datastore', __package__)
+
+# shows all debts in a single page
+ALL_ROWS = 10 ** 6
+
+# held by the process exporting into a directory
+LOCK_FILE = '.export.lock'
+
+PAGE = """<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Getränkekasse</title>
+<script src="plotly.min.js"></script>
+<script src="figures.js"></script>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; margin: 2rem auto;
+       max-width: 2000px; padding: 0 1rem; color: #212529; }}
+h1 {{ font-size: 4rem; font-weight: 300; margin: 1rem 0 2rem; }}
+.row {{ display: flex; gap: 1.5rem; margin-bottom: 1.5rem; }}
+.card {{ flex: 1; border: 1px solid #ddd; border-radius: .25rem; }}
+.card h2 {{ margin: 0; padding: .75rem 1.25rem; background: #f7f7f7;
+           border-bottom: 1px solid #ddd; }}
+.card .body {{ padding: 1.25rem; }}
+.info {{ color: #eee; padding: 1.25rem; border-radius: .25rem; flex: 1; }}
+.info .value {{ font-size: 300%; font-weight: bold; }}
+.wide {{ flex: 3; }}
+table {{ width: 100%; border-collapse: collapse; font-size: 120%; }}
+th {{ background: #d1d1d1; }}
+th, td {{ padding: 5px; text-align: center; border: 1px solid #ddd; }}
+nav button {{ font-size: 1.2rem; margin-left: .5rem; }}
+nav button.active {{ font-weight: bold; }}
+</style>
+</head>
+<body>
+<h1>Getränkekasse</h1>
+<div class="row">
+  <div class="info" style="background: #802020">
+    <div class="value" id="info-box-bestseller-value"></div>
+    <div>Bestseller des Monats</div>
+  </div>
+  <div class="info" style="background: #a07000">
+    <div class="value" id="info-box-royal-value"></div>
+    <div>Getränkekönig*in</div>
+  </div>
+  <div class="info" style="background: #216b27">
+    <div class="value" id="info-box-revenue-value"></div>
+    <div id="info-box-revenue-title"></div>
+  </div>
+</div>
+<div class="row">
+  <div class="card wide">
+    <h2>Käufe über Zeit <nav id="timeline-filter" style="float: right"></nav>
+    </h2>
+    <div class="body" id="timeline"></div>
+  </div>
+  <div class="card">
+    <h2>Schulden</h2>
+    <div class="body"><table id="debts"></table></div>
+  </div>
+</div>
+<div class="row">
+  <div class="card"><h2>Inventar</h2><div class="body" id="inventory"></div>
+  </div>
+  <div class="card"><h2>Wer trinkt was?</h2>
+    <div class="body" id="statistics"></div>
+  </div>
+</div>
+<p id="created"></p>
+<script>
+var data = null;
+var filter = null;
+
+function plot(id, figure) {{
+  Plotly.react(id, figure.data, figure.layout, {{responsive: true}});
+}}
+
+function text(id, value) {{
+  document.getElementById(id).textContent = value;
+}}
+
+function cell(tag, value) {{
+  var element = document.createElement(tag);
+  element.textContent = value;
+  return element;
+}}
+
+function render() {{
+  for (var id in data.values) text(id, data.values[id]);
+
+  var table = document.getElementById('debts');
+  table.innerHTML = '';
+  var header = table.insertRow();
+  data.debts.columns.forEach(function (column) {{
+    header.appendChild(cell('th', column.name));
+  }});
+  data.debts.rows.forEach(function (row) {{
+    var line = table.insertRow();
+    data.debts.columns.forEach(function (column) {{
+      var value = row[column.id];
+      // formatted columns show money
+      if (column.format && typeof value === 'number') {{
+        value = value.toFixed(2);
+      }}
+      line.appendChild(cell('td', value));
+    }});
+  }});
+
+  var nav = document.getElementById('timeline-filter');
+  nav.innerHTML = '';
+  if (!(filter in data.figures.timeline)) filter = data.filters[0].value;
+  data.filters.forEach(function (option) {{
+    var button = document.createElement('button');
+    button.textContent = option.label;
+    button.className = option.value === filter ? 'active' : '';
+    button.onclick = function () {{ filter = option.value; render(); }};
+    nav.appendChild(button);
+  }});
+
+  plot('timeline', data.figures.timeline[filter]);
+  plot('inventory', data.figures.inventory);
+  plot('statistics', data.figures.statistics);
+  text('created', 'Stand: ' + data.created);
+}}
+
+function load() {{
+  fetch('data.json', {{cache: 'no-store'}})
+    .then(function (response) {{ return response.json(); }})
+    .then(function (bundle) {{
+      if (data === null || bundle.created !== data.created) {{
+        data = bundle;
+        render();
+      }}
+    }});
+}}
+
+load();
+setInterval(load, {reload:d});
+</script>
+</body>
+</html>
+"""
+
+
+def render(dashapp):
+    """Render the complete state of the dashboard.
+
+    All callbacks are resolved through the request handler of the app,
+    exactly like the browser does on the first page load, followed by the
+    other groupings of the timeline.
+
+    Parameters
+    ----------
+    dashapp : dash.Dash
+        The dashboard.
+
+    Returns
+    -------
+    state : dict
+        Values of the info cards, the debt table and the figures.
+
+    """
+    client = dashapp.server.test_client()
+    base_url = dashapp.config.routes_pathname_prefix
+
+    props, callbacks = callgraph.load(
+        client.get(base_url + '_dash-layout').get_json(),
+        client.get(base_url + '_dash-dependencies').get_json(),
+    )
+    # everything below the fold is visible, all debts on one page
+    props[('details_visible', 'n_clicks')] = 1
+    props[('debt_table', 'page_size')] = ALL_ROWS
+
+    def call(callback):
+        response = client.post(base_url + '_dash-update-component',
+                               json=callgraph.request(callback, props))
+        if response.status_code == 204:
+            return set()
+        if response.status_code != 200:
+            raise RuntimeError('Callback {} failed with status {}'.format(
+                callback['output'], response.status_code))
+        return callgraph.update(props, response.get_json())
+
+    callgraph.dispatch(callbacks, callbacks, call)
+
+    figures = {
+        'inventory': props[('inventory', 'figure')],
+        'statistics': props[('statistics', 'figure')],
+        'timeline': {},
+    }
+    default = props[('filter_time_by', 'value')]
+    for option in props[('filter_time_by', 'options')]:
+        if option['value'] != default:
+            props[('filter_time_by', 'value')] = option['value']
+            callgraph.dispatch(callbacks, callgraph.triggered(
+                callbacks, {('filter_time_by', 'value')}
+            ), call)
+        figures['timeline'][option['value']] = props[('timeline', 'figure')]
+
+    return {
+        'created': datetime.datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
+        'values': {
+            ident: props[(ident, 'children')]
+            for ident in ['info-box-bestseller-value',
+                          'info-box-royal-value',
+                          'info-box-revenue-title',
+                          'info-box-revenue-value']
+        },
+        'debts': {
+            'columns': props[('debt_table', 'columns')],
+            'rows': props[('debt_table', 'data')],
+        },
+        'filters': props[('filter_time_by', 'options')],
+        'figures': figures,
+    }
+
+
+class Exporter:
+    """Export the dashboard to a static bundle when the data changes.
+
+    Every worker process of the server starts an exporter, only the one
+    holding the lock file of the directory exports. The others take over
+    if that process ends.
+
+    Parameters
+    ----------
+    dashapp : dash.Dash
+        The dashboard.
+    directory : str
+        Directory of the bundle.
+
+    """
+
+    def __init__(self, dashapp, directory):
+        self.dashapp = dashapp
+        self.directory = directory
+        self.version = None
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    def export(self):
+        """Render and write the bundle if the data version changed.
+
+        Returns
+        -------
+        exported : bool
+            True if the bundle was written.
+
+        """
+        with self._lock:
+            version = datastore.get_store().version
+            if version == self.version:
+                return False
+
+            state = render(self.dashapp)
+            state['version'] = version
+
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_static()
+            _write(os.path.join(self.directory, 'data.json'),
+                   json.dumps(state).encode())
+            self.version = version
+            return True
+
+    def run(self, interval):
+        """Export whenever the data changes. Does not return.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between two checks of the data version.
+
+        """
+        while True:
+            try:
+                if self._acquire():
+                    self.export()
+            except Exception:
+                self.dashapp.logger.exception('Snapshot export failed')
+            time.sleep(interval)
+
+    def _acquire(self):
+        """Try to become the exporting process of the directory.
+
+        Returns
+        -------
+        acquired : bool
+            True if this process holds the lock file.
+
+        """
+        if fcntl is None or self._lock_file is not None:
+            return True
+
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(os.path.join(self.directory, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # held until the process ends
+        self._lock_file = f
+        return True
+
+    def _write_static(self):
+        """Write the page and plotly.js if they are missing or outdated."""
+        from plotly.offline import get_plotlyjs
+
+        page = PAGE.format(reload=int(_interval() * 1000))
+        # decodes compact figures (see encoding.py)
+        with open(os.path.join(os.path.dirname(__file__), 'assets',
+                               'figures.js'), 'rb') as f:
+            decoder = f.read()
+        files = {
+            'index.html': page.encode(),
+            'plotly.min.js': get_plotlyjs().encode(),
+            'figures.js': decoder,
+        }
+        for name, content in files.items():
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    if f.read() == content:
+                        continue
+            _write(path, content)
+
+
+def start(dashapp):
+    """Start the export thread if ``SNAPSHOT_DIR`` is set.
+
+    Parameters
+    ----------
+    dashapp : dash.Dash
+        The dashboard.
+
+    Returns
+    -------
+    exporter : Exporter or None
+        The running exporter.
+
+    """
+    directory = os.getenv('SNAPSHOT_DIR')
+    if not directory:
+        return None
+
+    exporter = Exporter(dashapp, directory)
+    threading.Thread(target=exporter.run, args=(_interval(),),
+                     name='snapshot-export', daemon=True).start()
+    return exporter
+
+
+def _interval():
+    """Return the export interval in seconds."""
+    return float(os.getenv('SNAPSHOT_INTERVAL', 60))
+
+
+def _write(path, content):
+    """Replace a file atomically, readers never see a partial file."""
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + name,
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates files only readable by the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,145 @@
+"""Helpers for a fast startup of the dashboard.
+
+Heavy modules (pandas, numpy, plotly figures) are imported on first use via
+:func:`lazy_import`. The component libraries of the layout are not, dash
+builds the layout when it is assigned and needs the scripts of all
+component libraries before it serves the page. Setting the environment
+variable ``FAST_STARTUP=1`` additionally warms the data cache in a
+background thread, so that a freshly started worker answers its first
+requests without parsing the data files.
+"""
+import importlib
+import os
+import threading
+
+
+class LazyModule:
+    """Module proxy that imports the module on first attribute access.
+
+    Parameters
+    ----------
+    name : str
+        Module name, may be relative to ``package``.
+    package : str, optional
+        Package used to resolve relative module names.
+
+    """
+
+    def __init__(self, name, package=None):
+        self._name = name
+        self._package = package
+        self._module = None
+
+    def __getattr__(self, attr):
+        """Import the module and return one of its attributes."""
+        module = self._module
+        if module is None:
+            # thread safe, concurrent imports wait for each other
+            module = importlib.import_module(self._name, self._package)
+            self._module = module
+        return getattr(module, attr)
+
+
+def lazy_import(name, package=None):
+    """Defer the import of a module until it is used.
+
+    Parameters
+    ----------
+    name : str
+        Module name, may be relative to ``package``.
+    package : str, optional
+        Package used to resolve relative module names.
+
+    Returns
+    -------
+    module : LazyModule
+        Proxy of the module.
+
+    """
+    return LazyModule(name, package)
+
+
+def enabled():
+    """Check whether the startup-optimized mode is enabled.
+
+    Returns
+    -------
+    enabled : bool
+        True if the ``FAST_STARTUP`` environment variable is set.
+
+    """
+    return os.getenv("FAST_STARTUP", "").lower() in ("1", "true", "yes")
+
+
+def warm_up(tasks):
+    """Run warm-up tasks in a background thread.
+
+    Parameters
+    ----------
+    tasks : list of callable
+        Functions without arguments, run in the given order.
+
+    Returns
+    -------
+    thread : threading.Thread
+        The started daemon thread.
+
+    """
+    def run():
+        for task in tasks:
+            task()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _refresh_data():
+    """Parse the data files."""
+    from . import datastore
+
+    datastore.store.refresh()
+
+
+def _load_plot_validators():
+    """Build small figures to import the plotly validators they use."""
+    import pandas as pd
+
+    from . import plot_utils
+
+    counts = pd.Series([1], index=['x'])
+    plot_utils.plot_timeline(
+        pd.Series([1], index=pd.to_datetime(['2020-01-01']))
+    )
+    plot_utils.plot_purch_per_time(pd.Series([1], index=[0]), 'hour')
+    plot_utils.plot_inventory_chart(
+        pd.DataFrame({'stock': [1], 'price': [1.0]}, index=['x'])
+    )
+    plot_utils.plot_abs_drinks_per_person(counts)
+    plot_utils.plot_rel_drinks_per_person({'x': counts})
+
+
+def optimize(dashapp):
+    """Apply the startup optimizations if ``FAST_STARTUP`` is set.
+
+    Parses the data files (importing pandas) and loads the plotly
+    validators in the background.
+
+    Parameters
+    ----------
+    dashapp : dash.Dash
+        Dash app with layout and callbacks registered.
+
+    Returns
+    -------
+    thread : threading.Thread or None
+        Warm-up thread, None if the mode is disabled.
+
+    """
+    if not enabled():
+        return None
+
+    return warm_up([
+        _refresh_data,
+        _load_plot_validators,
+    ])